@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+""" Self Service Portal Exporter: Exposition Benchmark
+
+Compare the payload size and the rendering time of the former layout, one
+metric family per identifier, with a single family per metric name.
+
+Usage: python3 benchmarks/exposition.py [identifiers ...]
+"""
+
+import sys
+import timeit
+
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.samples import Sample
+
+PROVIDERS = ('AlmatelRussia', 'ArubaCloud', 'MegafonRussiaB2C', 'Vultr',
+             'WifireRussia')
+
+def make_labels(count: int) -> list[dict]:
+    """ Labels of `count` identifiers spread over the providers """
+
+    return [{
+        'identifier': f'identifier_{index}',
+        'provider': PROVIDERS[index % len(PROVIDERS)],
+        'poll_interval': '30m',
+        'category': 'SP',
+        'currency': '₽',
+        'description': f'Description {index}'
+    } for index in range(count)]
+
+class FamilyPerIdentifier:
+    """ Former layout: HELP/TYPE block repeated for each identifier """
+
+    def __init__(self, labels: list[dict]) -> None:
+        self.labels = labels
+
+    def collect(self) -> None:
+        """ Build a family per identifier on each scrape """
+
+        for index, labels in enumerate(self.labels):
+            gmf_object = GaugeMetricFamily(
+                'ssp_balance', labels['provider'], labels=list(labels))
+            gmf_object.add_metric(list(labels.values()), float(index))
+            yield gmf_object
+
+class SingleFamily:
+    """ Current layout: one family with ready-made samples """
+
+    def __init__(self, labels: list[dict]) -> None:
+        self.samples = [Sample('ssp_balance', item, float(index))
+                        for index, item in enumerate(labels)]
+
+    def collect(self) -> None:
+        """ Gather the ready-made samples """
+
+        gmf_object = GaugeMetricFamily(
+            'ssp_balance', 'Balance collected from Self Service Portal')
+        gmf_object.samples = list(self.samples)
+        yield gmf_object
+
+def measure(collector_class: type, count: int) -> tuple[int, float]:
+    """ Return payload size in bytes and milliseconds per scrape """
+
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(collector_class(make_labels(count)))
+
+    runs = max(1, 20000 // count)
+    seconds = timeit.timeit(lambda: generate_latest(registry), number=runs)
+
+    return len(generate_latest(registry)), seconds / runs * 1000
+
+if __name__ == '__main__':
+
+    counts = [int(count) for count in sys.argv[1:]] or [100, 1000, 10000]
+
+    print(f'{"identifiers":>12} {"layout":>22} {"bytes":>10} {"ms/scrape":>10}')
+    for identifiers in counts:
+        for layout in (FamilyPerIdentifier, SingleFamily):
+            size, elapsed = measure(layout, identifiers)
+            print(f'{identifiers:>12} {layout.__name__:>22} '
+                  f'{size:>10} {elapsed:>10.2f}')
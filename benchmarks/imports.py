@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+""" Self Service Portal Exporter: Provider Import Benchmark
+
+Compare the cold start of a fresh interpreter loading only the configured
+providers with one importing every provider module, as the package did.
+
+Usage: python3 benchmarks/imports.py [runs] [provider ...]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPETS = {
+    'lazy': (
+        'import providers\n'
+        'for name in {names!r}:\n'
+        '    providers.modules[name]\n'
+    ),
+    # Almatel and T2 used to import lxml at module level
+    'eager': (
+        'import providers\n'
+        'from importlib import import_module\n'
+        'from lxml import html\n'
+        'for spec in providers.index.values():\n'
+        '    import_module(f"providers.{{spec.module_name}}")\n'
+    )
+}
+
+# Runs the snippet and reports its wall time and the peak memory
+PROBE = (
+    'import resource, time\n'
+    'started = time.perf_counter()\n'
+    '{snippet}'
+    'print(time.perf_counter() - started, '
+    'resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n'
+)
+
+def measure(snippet: str, runs: int) -> tuple[float, float]:
+    """ Median seconds and peak KiB over `runs` fresh interpreters """
+
+    timings, memory = [], []
+
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(snippet=snippet)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+            env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+        ).stdout.splitlines()[-1].split()
+        timings.append(float(output[0]))
+        memory.append(float(output[1]))
+
+    return statistics.median(timings), statistics.median(memory)
+
+def main() -> None:
+    """ Print the import time and the peak memory of both strategies """
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    names = sys.argv[2:] or ['Vultr', 'ArubaCloud']
+
+    print(f'Providers: {", ".join(names)}, {runs} runs')
+    print(f'{"strategy":>8} {"import ms":>10} {"peak MiB":>9}')
+
+    for strategy, snippet in SNIPPETS.items():
+        seconds, kibibytes = measure(snippet.format(names=names), runs)
+        print(f'{strategy:>8} {seconds * 1000:10.1f} {kibibytes / 1024:9.1f}')
+
+if __name__ == '__main__':
+    main()
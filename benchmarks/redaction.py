@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+""" Self Service Portal Exporter: Redaction Benchmark
+
+Compare the former redaction, four uncompiled substitutions over every
+record, the same approach extended to the current rules and the trigger
+search of SensitiveDataFormatter.
+
+Usage: python3 benchmarks/redaction.py [repeats]
+"""
+
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logger import REDACTION_RULES, SensitiveDataFormatter # pylint: disable=wrong-import-position
+
+def legacy_filter(message: str) -> str:
+    """ Former SensitiveDataFormatter._filter() """
+
+    filters = [
+        [r"'password': '.+?'", "'password': '*****'"],
+        [r'"password": ".+?"', '"password": "*****"'],
+        [r'"password":\s+{\n\s+"value": ".+?"',
+            '"password": {\n\t"value": "*****"'],
+        [r'password=.+?', 'password=*****']
+    ]
+    for filter_pattern in filters:
+        message = re.sub(filter_pattern[0], filter_pattern[1], message)
+    return message
+
+def per_rule_filter(message: str) -> str:
+    """ Former approach covering the current rules, a substitution each """
+
+    for trigger, prefix, secret in REDACTION_RULES:
+        message = re.sub(f'({re.escape(trigger)}{prefix}){secret}',
+            r'\1*****', message, flags=re.IGNORECASE)
+    return message
+
+RECORDS = {
+    'short': '[2025-03-30 09:04:21,041] INFO vultr.py::Vultr::update_balance():'
+        ' user@domain.tld: Balance has been collected',
+    'cookies': '[2025-03-30 09:04:21,041] DEBUG megafon_russia_b2c.py::'
+        'MegafonRussiaB2C::_sign_in(): 79201234567: Cookies: ' + str({
+            f'COOKIE_{index}': 'x' * 40 for index in range(20)}
+            | {'NEW-CSRF-TOKEN': 'f' * 36}),
+    'instance': '[2025-03-30 09:04:21,041] DEBUG main.py::main::__str__(): '
+        + json.dumps({f'identifier_{index}': {
+            'value': {'identifier': f'identifier_{index}',
+                      'password': 'secret', 'poll_interval': 1800,
+                      'labels': {'currency': '$'}},
+            'type': 'Vultr'} for index in range(50)}, indent=4)
+}
+
+def main() -> None:
+    """ Print microseconds per record for both implementations """
+
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print(f'{"record":>8} {"bytes":>7} {"legacy us":>10} '
+          f'{"per rule us":>12} {"redactor us":>12}')
+
+    for name, record in RECORDS.items():
+        timings = [
+            min(timeit.repeat(lambda func=func: func(record),
+                number=repeats, repeat=5)) / repeats * 1e6
+            for func in (legacy_filter, per_rule_filter,
+                         SensitiveDataFormatter._filter) # pylint: disable=protected-access
+        ]
+        print(f'{name:>8} {len(record):7} {timings[0]:10.1f} '
+              f'{timings[1]:12.1f} {timings[2]:12.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+""" Self Service Portal Exporter: Balance History Module """
+
+from array import array
+
+import sys
+import threading
+
+from logger import Logger
+
+lgr = Logger(class_name=__name__)
+
+class BalanceHistory:
+    """ Fixed-size ring buffer of (timestamp, balance) with a linear fit """
+
+    def __init__(self, size: int = 720) -> None:
+        self.size = size
+        self._timestamps = array('d', bytes(8 * size))
+        self._balances = array('d', bytes(8 * size))
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+        # Timestamps are shifted by the origin to keep the sums precise
+        self._origin = None
+        self._sums = [0.0] * 5
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _account(self, timestamp: float, balance: float,
+                 sign: int = 1) -> None:
+        """ Add or remove a sample from the least squares sums """
+
+        time_offset = timestamp - self._origin
+        for index, value in enumerate((1.0, time_offset, balance,
+                time_offset * time_offset, time_offset * balance)):
+            self._sums[index] += sign * value
+
+    def _recompute(self) -> None:
+        """ Rebuild the sums from the buffer to drop accumulated errors """
+
+        samples = self._samples()
+
+        self._origin = samples[0][0]
+        self._sums = [0.0] * 5
+        for timestamp, balance in samples:
+            self._account(timestamp, balance)
+
+    def _samples(self) -> list[tuple[float, float]]:
+        """ Samples from the oldest one, the caller holds the lock """
+
+        start = (self._head - self._count) % self.size
+        return [(self._timestamps[(start + offset) % self.size],
+                 self._balances[(start + offset) % self.size])
+                for offset in range(self._count)]
+
+    def append(self, timestamp: float, balance: float) -> None:
+        """ Add a sample, evicting the oldest one once the buffer is full """
+
+        with self._lock:
+            # A top-up breaks the trend, start over from the new balance
+            if self._count and balance > self._balances[self._head - 1]:
+                self._count = 0
+                self._sums = [0.0] * 5
+
+            if self._count == 0:
+                self._origin = timestamp
+
+            if self._count == self.size:
+                self._account(self._timestamps[self._head],
+                    self._balances[self._head], sign=-1)
+            else:
+                self._count += 1
+
+            self._timestamps[self._head] = timestamp
+            self._balances[self._head] = balance
+            self._account(timestamp, balance)
+            self._head = (self._head + 1) % self.size
+
+            if self._head == 0:
+                self._recompute()
+
+    def burn_rate(self) -> float | None:
+        """ Balance spent per second, the negated slope of the fit """
+
+        with self._lock:
+            count, time_sum, balance_sum, time_square_sum, product_sum = \
+                self._sums
+
+            if self._count < 2:
+                return None
+
+            denominator = count * time_square_sum - time_sum * time_sum
+            if denominator <= 0:
+                return None
+
+            return -(count * product_sum - time_sum * balance_sum) \
+                / denominator
+
+    def depletion(self) -> float | None:
+        """ Seconds until the balance reaches zero at the current rate """
+
+        burn_rate = self.burn_rate()
+
+        with self._lock:
+            if not burn_rate or burn_rate <= 0 or self._count == 0:
+                return None
+
+            balance = self._balances[self._head - 1]
+
+        return max(balance, 0.0) / burn_rate
+
+    def samples(self) -> list[tuple[float, float]]:
+        """ Return the samples from the oldest one """
+
+        with self._lock:
+            return self._samples()
+
+if __name__ == '__main__':
+
+    lgr.logger.critical(
+        'This module must not be run as a standalone application')
+
+    # sysexits.h: EX_OSERR
+    sys.exit(71)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+""" Self Service Portal Exporter: Asynchronous HTTP Server Module """
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+import asyncio
+import gzip
+import hashlib
+import sys
+import threading
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.registry import CollectorRegistry
+
+from logger import Logger
+
+lgr = Logger(class_name=__name__)
+
+# Handler: query parameters -> (status, content type, body)
+Handler = Callable[[dict], tuple[int, str, bytes]]
+
+REASONS = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable'
+}
+
+class MetricsServer:
+    """ Keep-alive HTTP server serving the cached exposition """
+
+    def __init__(self, registry: CollectorRegistry,
+                 version: Callable[[], int], ready: Callable[[], bool],
+                 max_age: int = 60, idle_timeout: int = 75,
+                 route_workers: int = 8) -> None:
+        self.registry = registry
+        self.version = version
+        self.ready = ready
+        self.max_age = max_age
+        self.idle_timeout = idle_timeout
+
+        # (version, rendered at, body, gzip body, etag)
+        self._exposition = None
+        self._exposition_lock = threading.Lock()
+
+        self.routes = {
+            '/healthz': self._healthz,
+            '/readyz': self._readyz
+        }
+
+        # Cheap routes answered within the event loop, the others run on
+        # their own pool: slow probes must not hold up /metrics or liveness
+        self._inline = {'/healthz', '/readyz'}
+        self._route_executor = ThreadPoolExecutor(
+            max_workers=route_workers, thread_name_prefix='http-route')
+
+    def add_route(self, path: str, handler: Handler) -> None:
+        """ Serve `path` with the handler on the route pool """
+
+        self.routes[path] = handler
+
+    def start(self, address: str = 'localhost', port: int = 10032) -> None:
+        """ Run the server in a background event loop """
+
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(
+            asyncio.start_server(self._serve, address, port))
+
+        threading.Thread(
+            target=loop.run_until_complete,
+            args=(server.serve_forever(),),
+            name='http-server',
+            daemon=True
+        ).start()
+
+    def _render(self) -> tuple:
+        """ Return the exposition, rendered and compressed once per update """
+
+        with self._exposition_lock:
+            version = self.version()
+
+            if (self._exposition is None
+                or self._exposition[0] != version
+                or time.monotonic() - self._exposition[1] > self.max_age):
+
+                body = generate_latest(self.registry)
+                self._exposition = (
+                    version,
+                    time.monotonic(),
+                    body,
+                    gzip.compress(body, compresslevel=6),
+                    f'"{hashlib.sha1(body).hexdigest()}"'
+                )
+
+            return self._exposition
+
+    @staticmethod
+    def _healthz(_: dict) -> tuple[int, str, bytes]:
+        return 200, 'text/plain; charset=utf-8', b'OK\n'
+
+    def _readyz(self, _: dict) -> tuple[int, str, bytes]:
+        if self.ready():
+            return 200, 'text/plain; charset=utf-8', b'OK\n'
+        return 503, 'text/plain; charset=utf-8', b'Not ready\n'
+
+    async def _serve(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """ Serve requests of a connection until it is closed """
+
+        try:
+            while await self._serve_request(reader, writer):
+                pass
+        except (asyncio.TimeoutError, ConnectionError,
+                asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_request(self, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter) -> bool:
+        """ Serve a single request, return whether to keep the connection """
+
+        request_line = await asyncio.wait_for(
+            reader.readline(), self.idle_timeout)
+        if not request_line:
+            return False
+
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            content_length = int(headers.get('content-length') or 0)
+        except ValueError:
+            content_length = -1
+
+        # The body of an invalid length cannot be skipped, close the connection
+        if content_length < 0:
+            await self._respond(writer, 400, 'text/plain', b'', False)
+            return False
+
+        if content_length:
+            await reader.readexactly(content_length)
+
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            await self._respond(writer, 400, 'text/plain', b'', False)
+            return False
+
+        keep_alive = (headers.get('connection', '').lower() != 'close'
+            if version == 'HTTP/1.1'
+            else headers.get('connection', '').lower() == 'keep-alive')
+
+        if method not in ('GET', 'HEAD'):
+            await self._respond(writer, 405, 'text/plain', b'', keep_alive)
+            return keep_alive
+
+        url = urlsplit(target)
+        extra = {}
+
+        try:
+            if url.path == '/metrics':
+                _, _, body, gzip_body, etag = await asyncio.to_thread(
+                    self._render)
+                content_type = CONTENT_TYPE_LATEST
+                extra = {'ETag': etag, 'Vary': 'Accept-Encoding'}
+
+                if headers.get('if-none-match') == etag:
+                    status, body = 304, b''
+                else:
+                    status = 200
+                    if 'gzip' in headers.get('accept-encoding', ''):
+                        body = gzip_body
+                        extra['Content-Encoding'] = 'gzip'
+
+            elif url.path in self._inline:
+                status, content_type, body = self.routes[url.path](
+                    parse_qs(url.query))
+
+            elif url.path in self.routes:
+                status, content_type, body = \
+                    await asyncio.get_running_loop().run_in_executor(
+                        self._route_executor, self.routes[url.path],
+                        parse_qs(url.query))
+
+            else:
+                status, content_type, body = 404, 'text/plain', b'Not Found\n'
+
+        # A failing route must not drop the connection without an answer
+        except Exception: # pylint: disable=broad-exception-caught
+            lgr.logger.exception('Route `%s` failed', url.path)
+            status, content_type, body = \
+                500, 'text/plain', b'Internal Server Error\n'
+            extra = {}
+
+        await self._respond(writer, status, content_type,
+            b'' if method == 'HEAD' else body, keep_alive, extra,
+            content_length=len(body))
+        return keep_alive
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int,
+                       content_type: str, body: bytes, keep_alive: bool,
+                       extra: dict = None, content_length: int = None) -> None:
+        """ Write the response """
+
+        headers = {
+            'Content-Type': content_type,
+            'Content-Length': str(len(body) if content_length is None
+                                  else content_length),
+            'Connection': 'keep-alive' if keep_alive else 'close',
+            **(extra or {})
+        }
+
+        writer.write(
+            f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'.encode()
+            + ''.join(f'{name}: {value}\r\n'
+                      for name, value in headers.items()).encode('latin-1')
+            + b'\r\n' + body)
+        await writer.drain()
+
+if __name__ == '__main__':
+
+    lgr.logger.critical(
+        'This module must not be run as a standalone application')
+
+    # sysexits.h: EX_OSERR
+    sys.exit(71)
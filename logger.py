@@ -1,44 +1,272 @@
 #!/usr/bin/env python3
 """ Self Service Portal Exporter: Logger Module """
 
+import atexit
+import contextvars
+import copy
 import re
 import sys
 import json
 import logging
+import queue
+import threading
+import uuid
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Redaction rules: (trigger, rest of the kept prefix, masked secret). Rules
+# are matched against the lowercased record, so they are written in lower
+# case. The text from the trigger up to the secret is kept
+REDACTION_RULES = [
+    # Passwords in dictionaries, JSON dumps and form data
+    ('password', r"': '", r"[^']+"),
+    ('password', r'": "', r'[^"]+'),
+    ('password', r'":\s+{\n\s+"value": "', r'[^"]+'),
+    ('password', r'=', r'[^&\s\'"]+'),
+    # Tokens, secrets and session keys in cookies, headers and JSON
+    ('token', r'[\'"]:\s*[\'"]', r'[^\'"]+'),
+    ('token', r':\s*', r'[^\s\'",]+'),
+    ('secret', r'[\'"]:\s*[\'"]', r'[^\'"]+'),
+    ('session', r'_?id[\'"]:\s*[\'"]', r'[^\'"]+'),
+    # PHP session cookies of Almatel and T2: PHPSESSID
+    ('sessid', r'[\'"]:\s*[\'"]', r'[^\'"]+'),
+    ('sessid', r'=', r'[^;&\s\'"]+'),
+    ('bearer', r'\s+', r'[\w\-.~+/]+=*'),
+    # JSON Web Tokens anywhere in the message, the header is kept: eyJ*****
+    ('eyj', '', r'[\w-]+\.[\w-]+\.[\w-]*')
+]
+
+class Redactor:
+    """ Mask secrets following trigger words in a single rebuild """
+
+    def __init__(self, rules: list[tuple[str, str, str]] = None) -> None:
+        self._rules = {}
+        self._patterns = {}
+
+        for trigger, prefix, secret in rules or []:
+            self.add_rule(trigger, prefix, secret)
+
+    def add_rule(self, trigger: str, prefix: str, secret: str) -> None:
+        """ Add a rule, the rules of a trigger share a compiled pattern """
+
+        trigger = trigger.lower()
+        rules = self._rules.setdefault(trigger, [])
+        rules.append((prefix, secret))
+
+        # A literal start lets the engine skip to the trigger like
+        # str.find(), a plain alternation of all rules would try every
+        # rule at every position and is an order of magnitude slower
+        self._patterns[trigger] = re.compile(re.escape(trigger) + '(?:' +
+            '|'.join(f'(?P<rule{index}>{rule_prefix}){rule_secret}'
+                     for index, (rule_prefix, rule_secret)
+                     in enumerate(rules)) + ')')
+
+    def __call__(self, message: str) -> str:
+        # Only İ grows when lowered, offsets must match the original text
+        lowered = message.replace('\u0130', 'i').lower()
+        spans = []
+
+        # The prefix group is the only group, so it is the last one matched
+        for trigger, pattern in self._patterns.items():
+            if trigger in lowered:
+                spans.extend((match.end(match.lastgroup), match.end())
+                             for match in pattern.finditer(lowered))
+
+        if not spans:
+            return message
+
+        parts = []
+        last = 0
+
+        for start, end in sorted(spans):
+            # Already masked by another rule, e.g. a JWT token in JSON
+            if start < last:
+                continue
+
+            parts.append(message[last:start])
+            parts.append('*****')
+            last = end
+
+        parts.append(message[last:])
+        return ''.join(parts)
 
 class SensitiveDataFormatter(logging.Formatter):
     """ Logging Sensitive Data Formatter """
 
-    @staticmethod
-    def _filter(message: str=None):
-        filters = [
-            [r"'password': '.+?'", "'password': '*****'"],
-            [r'"password": ".+?"', '"password": "*****"'],
-            [r'"password":\s+{\n\s+"value": ".+?"',
-                '"password": {\n\t"value": "*****"'],
-            [r'password=.+?', 'password=*****']
-        ]
-        for filter_pattern in filters:
-            message = re.sub(filter_pattern[0], filter_pattern[1], message)
-        return message
+    redactor = Redactor(REDACTION_RULES)
+
+    @classmethod
+    def _filter(cls, message: str=None):
+        return cls.redactor(message)
 
     def format(self, record: str=''):
         original = logging.Formatter.format(self, record)
         return self._filter(original)
 
+class JsonFormatter(SensitiveDataFormatter):
+    """ JSON lines formatter with the poll context of the record """
+
+    # Record attributes added by log_context() or `extra`
+    context_fields = ('provider', 'identifier', 'poll_id', 'step', 'duration')
+
+    def format(self, record: logging.LogRecord = None) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc)
+                .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'function': record.funcName,
+            'message': self._filter(record.getMessage())
+        }
+
+        for name in self.context_fields:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+
+        # Queued records keep the traceback text only, see prepare()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = self._filter(record.exc_text)
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+# Fields of the poll being run by the current thread or asyncio task
+_log_context = contextvars.ContextVar('log_context', default={})
+
+@contextmanager
+def log_context(**fields):
+    """ Add the fields to the records logged within the block """
+
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+def update_log_context(**fields) -> None:
+    """ Change the fields until the enclosing log_context() block ends """
+
+    _log_context.set({**_log_context.get(), **fields})
+
+def new_poll_id() -> str:
+    """ Return an identifier tying the records of a single poll together """
+
+    return uuid.uuid4().hex[:16]
+
+_exception_formatter = logging.Formatter()
+
+class CountingQueueHandler(QueueHandler):
+    """ Queue handler dropping records instead of blocking on a full queue """
+
+    def __init__(self, record_queue: queue.Queue) -> None:
+        super().__init__(record_queue)
+        self.emitted = 0
+        self.dropped = 0
+        self._counter_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike QueueHandler.prepare() the traceback is not merged into the
+        # message: the text format appends `exc_text` by itself and the
+        # JSON format writes it to its own field
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _exception_formatter.formatException(
+                record.exc_info)
+
+        message = record.getMessage()
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+
+        # Context variables are not visible to the writer thread, copy
+        # them to the record while still in the logging thread
+
+        for name, value in _log_context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._counter_lock:
+                self.dropped += 1
+        else:
+            with self._counter_lock:
+                self.emitted += 1
+
+LOG_FORMATS = {
+    'text': lambda: SensitiveDataFormatter(
+        '[%(asctime)s] %(levelname)s %(module)s.py::'
+        '%(name)s::%(funcName)s(): %(message)s',
+    ),
+    'json': JsonFormatter
+}
+
+# A single writer thread formats and prints the records of all loggers
+_console_handler = logging.StreamHandler(sys.stdout)
+_console_handler.setFormatter(LOG_FORMATS['text']())
+queue_handler = CountingQueueHandler(queue.Queue(maxsize=10000))
+_listener = QueueListener(queue_handler.queue, _console_handler)
+_listener_lock = threading.Lock()
+_listener_started = threading.Event()
+
+def _stop_listener() -> None:
+    """ Write the queued records before the interpreter exits """
+
+    try:
+        _listener.stop()
+    except queue.Full:
+        pass
+
+def set_log_format(name: str) -> None:
+    """ Switch the output of all loggers to the `text` or `json` format """
+
+    _console_handler.setFormatter(LOG_FORMATS[name]())
+
+# Names of the loggers created by Logger and the level set for all of them
+_logger_names = set()
+_log_level = None
+
+def set_log_level(level: int) -> None:
+    """ Set the level of every logger, created or still to be created """
+
+    global _log_level # pylint: disable=global-statement
+
+    with _listener_lock:
+        _log_level = level
+        for name in _logger_names:
+            logging.getLogger(name).setLevel(level)
+
 class Logger:
     """ Logger class """
 
-    def __init__(self, log_level: int = 20, class_name: str=None):
+    def __init__(self, log_level: int = None, class_name: str=None):
         self.logger = logging.getLogger(class_name)
-        self._console_handler = logging.StreamHandler(sys.stdout)
-        self._console_handler.setFormatter(
-            SensitiveDataFormatter(
-                '[%(asctime)s] %(levelname)s %(module)s.py::'
-                '%(name)s::%(funcName)s(): %(message)s',
-            )
-        )
-        self.logger.addHandler(self._console_handler)
+
+        if log_level is None:
+            log_level = 20 if _log_level is None else _log_level
+
+        with _listener_lock:
+            _logger_names.add(class_name)
+
+            if not _listener_started.is_set():
+                _listener.start()
+                _listener_started.set()
+                atexit.register(_stop_listener)
+
+            # Loggers are shared by name, attach the handler only once
+            if queue_handler not in self.logger.handlers:
+                self.logger.addHandler(queue_handler)
+
         self.logger.setLevel(log_level)
 
     def __str__(self) -> str:
@@ -2,29 +2,44 @@
 
 """  Self Service Portal Exporter """
 
-from dataclasses import dataclass
+from dataclasses import MISSING, dataclass, fields
 
 import argparse
+import hashlib
 import json
 import logging
 import os
 import random
 import signal
 import sys
+import threading
 import time
 
 from pathlib import Path
 from types import ModuleType
 from typing import Callable
-from prometheus_client import start_http_server
-from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from prometheus_client import (CONTENT_TYPE_LATEST, generate_latest,
+    start_http_server)
+from prometheus_client.core import (CounterMetricFamily, GaugeMetricFamily,
+    REGISTRY)
+from prometheus_client.samples import Sample
 
 import jsonschema
-import schedule
 import yaml
 import providers
+import transport
 
-from logger import Logger
+from history import BalanceHistory
+from http_server import MetricsServer
+from probe import SingleFlight, Snapshot
+from logger import (LOG_FORMATS, Logger, log_context, new_poll_id,
+    queue_handler, set_log_format, set_log_level)
+from result import PollResult
+from scheduler import JobRunner, Scheduler, phase_start, shard_owner
+from state import StateStore
+
+# The C-accelerated loader is available when PyYAML is built with libyaml
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
 def min_string_length(min_length: int=0) -> Callable | Exception:
     """ String length validation """
@@ -77,6 +92,7 @@ def terminate_signal(signal_number: int = None, _: str = None) -> None:
     """ Terminate by SIGTERM """
 
     lgr.logger.critical('Received the termination signal: %s', signal_number)
+    transport.pool.close()
     lgr.logger.critical('Gracefully terminated')
     sys.exit(0)
 
@@ -141,6 +157,102 @@ def get_args(show_usage: bool = False) -> argparse.Namespace:
                                 default=10032
                                 )
                              )
+    args_parser.add_argument('--http-server',
+                             help='HTTP server serving metrics: `prometheus` '
+                                    'renders the metrics on each request, '
+                                    '`async` serves cached and compressed '
+                                    'metrics with /healthz and /readyz. '
+                                    'Environment variable name: '
+                                    'SSP_EXPORTER_HTTP_SERVER. '
+                                    'Default: prometheus',
+                             required=False,
+                             type=str,
+                             choices=['prometheus', 'async'],
+                             default=env_variable_check(
+                                name='SSP_EXPORTER_HTTP_SERVER',
+                                min_length=5,
+                                default='prometheus'
+                                )
+                             )
+    args_parser.add_argument('--probe-only',
+                             help='Do not poll on schedule, collect '
+                                    'identifiers requested at /probe only, '
+                                    'requires `--http-server async`. '
+                                    'Environment variable name: '
+                                    'SSP_EXPORTER_PROBE_ONLY. Default: false',
+                             required=False,
+                             action='store_true',
+                             default=str(env_variable_check(
+                                name='SSP_EXPORTER_PROBE_ONLY',
+                                min_length=1
+                                )).lower() in ('1', 'true', 'yes')
+                             )
+    args_parser.add_argument('--shard-index',
+                             help='Index of this replica, from 0, among '
+                                    '`--shard-count` replicas sharing the '
+                                    'configuration file. '
+                                    'Environment variable name: '
+                                    'SSP_EXPORTER_SHARD_INDEX. Default: 0',
+                             required=False,
+                             type=int,
+                             default=env_variable_check(
+                                name='SSP_EXPORTER_SHARD_INDEX',
+                                min_length=1,
+                                default='0'
+                                )
+                             )
+    args_parser.add_argument('--shard-count',
+                             help='Number of replicas splitting the '
+                                    'identifiers between them. '
+                                    'Environment variable name: '
+                                    'SSP_EXPORTER_SHARD_COUNT. Default: 1',
+                             required=False,
+                             type=int,
+                             default=env_variable_check(
+                                name='SSP_EXPORTER_SHARD_COUNT',
+                                min_length=1,
+                                default='1'
+                                )
+                             )
+    args_parser.add_argument('--config-cache',
+                             help='Path to a file keeping the parsed and '
+                                    'validated configuration, reused while '
+                                    'the configuration and schema files are '
+                                    'unchanged. Environment variable name: '
+                                    'SSP_EXPORTER_CONFIG_CACHE. Default: None',
+                             required=False,
+                             type=min_string_length(1),
+                             default=env_variable_check(
+                                name='SSP_EXPORTER_CONFIG_CACHE',
+                                min_length=1
+                                )
+                             )
+    args_parser.add_argument('--watch-interval',
+                             help='Seconds between checks of the '
+                                    'configuration file for changes, 0 '
+                                    'reloads on SIGHUP only. '
+                                    'Environment variable name: '
+                                    'SSP_EXPORTER_WATCH_INTERVAL. Default: 0',
+                             required=False,
+                             type=int,
+                             default=env_variable_check(
+                                name='SSP_EXPORTER_WATCH_INTERVAL',
+                                min_length=1,
+                                default='0'
+                                )
+                             )
+    args_parser.add_argument('--state-file',
+                             help='Path to SQLite file keeping the last '
+                                    'results and sessions across restarts. '
+                                    'Environment variable name: '
+                                    'SSP_EXPORTER_STATE_FILE. Default: None',
+                             required=False,
+                             type=min_string_length(1),
+                             default=env_variable_check(
+                                name='SSP_EXPORTER_STATE_FILE',
+                                min_length=1
+                                )
+                             )
     args_parser.add_argument('--loglevel', '-l',
                              help='Logging level. Environment variable name: '
                                     'SSP_EXPORTER_LOG_LEVEL. Default: INFO',
@@ -155,6 +267,21 @@ def get_args(show_usage: bool = False) -> argparse.Namespace:
                                 default='INFO'
                                 )
                              )
+    args_parser.add_argument('--logformat',
+                             help='Logging format, `json` writes a JSON '
+                                    'object per line with the provider, '
+                                    'identifier, poll ID, step and duration '
+                                    'fields. Environment variable name: '
+                                    'SSP_EXPORTER_LOG_FORMAT. Default: text',
+                             required=False,
+                             type=str,
+                             choices=['text', 'json'],
+                             default=env_variable_check(
+                                name='SSP_EXPORTER_LOG_FORMAT',
+                                min_length=4,
+                                default='text'
+                                )
+                             )
 
     # Special switcher to show usage
     if show_usage:
@@ -164,35 +291,90 @@ def get_args(show_usage: bool = False) -> argparse.Namespace:
 
     return args_parser
 
+# Schema hash -> validator, the schema is checked and compiled only once
+_validators = {}
+
+def get_validator(schema: dict) -> jsonschema.protocols.Validator:
+    """ Return the validator of the draft declared by the schema """
+
+    schema_hash = hashlib.sha256(
+        json.dumps(schema, sort_keys=True).encode('utf8')).hexdigest()
+
+    if schema_hash not in _validators:
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator_class.check_schema(schema)
+        _validators[schema_hash] = validator_class(schema)
+
+    return _validators[schema_hash]
+
+class ConfigurationError(Exception):
+    """ Invalid configuration met while the exporter keeps running """
+
 @dataclass
 class Configuration:
     """ Configuration class """
 
     config_file: str = None
     schema_file: str = None
+    exit_on_error: bool = True
+    cache_file: str = None
 
     def __post_init__(self) -> None:
-        self.configuration = self._load_config(self.config_file)
-        self.schema = self._load_config(self.schema_file)
+        started = time.perf_counter()
+
+        config_data = self._read_file(self.config_file)
+        schema_data = self._read_file(self.schema_file)
+
+        # Parsed and validated configuration of the very same files
+        cache_key = hashlib.sha256(
+            config_data + b'\0' + schema_data).hexdigest()
+        self.configuration = self._load_cache(cache_key)
+
+        if self.configuration is not None:
+            self.schema = self._load_config(self.schema_file, schema_data)
+            lgr.logger.info('Configuration loaded from cache `%s` in %.3f '
+                'seconds', self.cache_file, time.perf_counter() - started)
+            self._check_identifiers()
+            return
+
+        self.configuration = self._load_config(self.config_file, config_data)
+        self.schema = self._load_config(self.schema_file, schema_data)
+        parsed = time.perf_counter()
 
         if self.configuration is None:
             lgr.logger.error('Configuration is not defined')
             # sysexits.h: EX_DATAERR
-            sys.exit(65)
+            self._fail(65, 'Configuration is not defined')
 
         if self.schema is None:
             lgr.logger.error('JSON schema is not defined')
             # sysexits.h: EX_DATAERR
-            sys.exit(65)
+            self._fail(65, 'JSON schema is not defined')
 
         self._validate_config()
+        self._check_identifiers()
+
+        lgr.logger.info('Configuration loaded in %.3f seconds: parse %.3f, '
+            'validate %.3f', time.perf_counter() - started, parsed - started,
+            time.perf_counter() - parsed)
+
+        self._save_cache(cache_key)
+
+    def _fail(self, exit_code: int, message: str) -> None:
+        """ Exit at startup, raise on reload to keep the running state """
+
+        if self.exit_on_error:
+            sys.exit(exit_code)
+
+        raise ConfigurationError(message)
 
     def _validate_config(self) -> bool:
         """ Validate configuration file """
 
-        # JSON Schema validator for configuration file
-        validation_errors = jsonschema.Draft7Validator(
-                    self.schema).iter_errors(self.configuration)
+        # JSON Schema validator for configuration file, of the draft the
+        # schema declares, built once per schema
+        validation_errors = get_validator(self.schema).iter_errors(
+            self.configuration)
 
         configuration_errors = []
         for error in validation_errors:
@@ -206,10 +388,13 @@ class Configuration:
 
             lgr.logger.critical('The configuration format is malformed')
             # sysexits.h: EX_DATAERR
-            sys.exit(65)
+            self._fail(65, 'The configuration format is malformed')
 
         lgr.logger.debug('Configuration file format is valid')
 
+    def _check_identifiers(self) -> None:
+        """ Refuse a configuration without enabled identifiers """
+
         identifiers_overall = sum(
                 len(self.configuration['identifiers'][provider]) for
                         provider in self.configuration['identifiers']
@@ -224,7 +409,7 @@ class Configuration:
         if identifiers_overall == identifiers_disabled:
             lgr.logger.critical('All available identifiers are disabled')
             # sysexits.h: EX_CONFIG
-            sys.exit(78)
+            self._fail(78, 'All available identifiers are disabled')
 
     def get_configuration(self) -> dict:
         """ Return the configuration structure """
@@ -256,28 +441,128 @@ class Configuration:
 
         self.configuration['service']['bind_port'] = bind_port
 
-    @staticmethod
-    def _load_config(file: str = None) -> dict | None:
-        """ Read configuration file """
-
-        if Path(file).is_file():
-            lgr.logger.debug('Load configuration file `%s`', file)
-            file_extension = Path(file).suffix.lower()
-
-            if file_extension in ('.yaml', '.yml'):
-                with open(file, 'r', encoding='utf8') as yaml_data:
-                    return yaml.full_load(yaml_data)
-            elif '.json' == file_extension:
-                with open(file, 'r', encoding='utf8') as json_data:
-                    return json.load(json_data)
-            else:
-                lgr.logger.critical('Cannot load configuration file `%s`', file)
-                # sysexits.h: EX_DATAERR
-                sys.exit(65)
-        else:
+    def _read_file(self, file: str = None) -> bytes:
+        """ Read the raw content of a configuration file """
+
+        if not Path(file).is_file():
             lgr.logger.critical('Cannot find configuration file `%s`', file)
             # sysexits.h: EX_OSFILE
-            sys.exit(72)
+            self._fail(72, f'Cannot find configuration file `{file}`')
+
+        return Path(file).read_bytes()
+
+    def _load_config(self, file: str, data: bytes) -> dict | None:
+        """ Parse configuration file """
+
+        lgr.logger.debug('Load configuration file `%s`', file)
+        file_extension = Path(file).suffix.lower()
+
+        if file_extension in ('.yaml', '.yml'):
+            # The C parser is several times faster when libyaml is present
+            return yaml.load(data.decode('utf8'), Loader=YAML_LOADER)
+
+        if '.json' == file_extension:
+            return json.loads(data)
+
+        lgr.logger.critical('Cannot load configuration file `%s`', file)
+        # sysexits.h: EX_DATAERR
+        self._fail(65, f'Cannot load configuration file `{file}`')
+        return None
+
+    def _load_cache(self, cache_key: str) -> dict | None:
+        """ Return the cached configuration if it has the same key """
+
+        if self.cache_file is None or not Path(self.cache_file).is_file():
+            return None
+
+        try:
+            cache = json.loads(Path(self.cache_file).read_bytes())
+        except (OSError, ValueError) as err:
+            lgr.logger.warning('Ignore configuration cache `%s`: %s',
+                self.cache_file, err)
+            return None
+
+        if cache.get('key') != cache_key:
+            lgr.logger.debug('Configuration cache `%s` is outdated',
+                self.cache_file)
+            return None
+
+        return cache['configuration']
+
+    def _save_cache(self, cache_key: str) -> None:
+        """ Keep the validated configuration for the next start """
+
+        if self.cache_file is None:
+            return
+
+        try:
+            data = json.dumps({'key': cache_key,
+                'configuration': self.configuration}).encode('utf8')
+
+            # Write aside and rename to never leave a truncated file
+            file_descriptor = os.open(f'{self.cache_file}.tmp',
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(file_descriptor, 'wb') as cache_data:
+                cache_data.write(data)
+            os.replace(f'{self.cache_file}.tmp', self.cache_file)
+        except (OSError, TypeError, ValueError) as err:
+            lgr.logger.warning('Cannot save configuration cache `%s`: %s',
+                self.cache_file, err)
+
+class ConfigurationReloader:
+    """ Reload the configuration on SIGHUP or when the file changes """
+
+    def __init__(self, collector: 'SSPCollector', config_file: str,
+                 schema_file: str, cache_file: str = None) -> None:
+        self.collector = collector
+        self.config_file = config_file
+        self.schema_file = schema_file
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._signature = self._file_signature()
+
+    def _file_signature(self) -> tuple | None:
+        """ Modification time and size of the configuration file """
+
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self) -> None:
+        """ Validate the file and apply it, keep running on errors """
+
+        with self._lock:
+            self._signature = self._file_signature()
+            lgr.logger.info('Reload configuration file `%s`', self.config_file)
+
+            try:
+                configuration = Configuration(
+                    config_file=self.config_file,
+                    schema_file=self.schema_file,
+                    exit_on_error=False,
+                    cache_file=self.cache_file
+                )
+            except (ConfigurationError, yaml.YAMLError, ValueError) as err:
+                lgr.logger.error(
+                    'Keep the running configuration: %s', err)
+                return
+
+            self.collector.reload(configuration.get_configuration())
+
+    def signal(self, *_) -> None:
+        """ SIGHUP handler, reload out of the interrupted main thread """
+
+        threading.Thread(
+            target=self.reload, name='reload', daemon=True).start()
+
+    def check(self, due: float = None) -> None: # pylint: disable=unused-argument
+        """ Scheduled job reloading the file once it has changed """
+
+        if self._file_signature() != self._signature:
+            self.signal()
 
 class SSPCollector:
     """ Self Service Portal collector class """
@@ -286,42 +571,132 @@ class SSPCollector:
         self.configuration = kwargs['configuration']
         self.log_level = kwargs['log_level']
         self.exporter = {}
+        startup_queue = []
+
+        # Replicas poll disjoint subsets of the configured identifiers
+        self.shard_index = kwargs.get('shard_index', 0)
+        self.shard_count = kwargs.get('shard_count', 1)
+
+        # Labels per identifier, prepared once, and the ready samples per
+        # metric and identifier, rebuilt when its job finishes
+        self._labels = {}
+        self._samples = {
+            self.configuration['service']['metric_name']: {},
+            'ssp_poll_status': {},
+            'ssp_last_success_timestamp_seconds': {},
+            'ssp_poll_duration_seconds': {},
+            'ssp_poll_attempts_total': {},
+            'ssp_balance_burn_rate': {},
+            'ssp_balance_depletion_seconds': {}
+        }
+        self._providers = {}
+
+        # Identifier -> last result, last successful result, attempts
+        self.results = {}
+        self._last_success = {}
+        self._attempts = {}
+        self._codes = {value: name for name, value in
+            self.configuration['service']['messages'].items()}
+
+        # Identifier -> recent successful balances for the trend
+        self.history = {}
+
+        # Probed identifiers are collected on demand only, scheduled jobs
+        # and probes of an identifier never collect it at the same time
+        self.probe_only = kwargs.get('probe_only', False)
+        self._polls = SingleFlight()
+        self._probe_lock = threading.Lock()
+
+        # Identifier -> its configuration item, to diff on reload
+        self._items = {}
+        self._reload_lock = threading.Lock()
+
+        # Bumped on each change of samples, identifiers without a result yet
+        self.version = 0
+        self._awaiting_first = set()
+
+        # Last results and sessions kept across restarts
+        self.state = None
+        if kwargs.get('state_file'):
+            self.state = StateStore(kwargs['state_file'])
+            lgr.logger.info('Keep state in `%s`', kwargs['state_file'])
+        saved_results = self.state.load_results() if self.state else {}
+
+        # Per-host limits shared by all identifiers of the provider
+        transport.configure(
+            rate_limits=self.configuration['service'].get('rate_limits'),
+            timeouts=self.configuration['service'].get('timeouts'),
+            connection_pool=self.configuration['service'].get(
+                'connection_pool'),
+            session_cache_settings=self.configuration['service'].get(
+                'session_cache'),
+            session_store=self.state)
+
+        # Fixed-rate timers, the main thread runs the scheduler loop
+        self.scheduler = Scheduler()
+
+        # Scheduled jobs are dispatched to the worker pool
+        self.runner = JobRunner(
+            max_workers=self.configuration['service'].get(
+                'worker_threads', 8),
+            provider_concurrency=self.configuration['service'].get(
+                'provider_concurrency', 4)
+        )
 
-        for prov_name, module in providers.modules.items():
-            if (prov_name in self.configuration['identifiers']
-                and self.configuration['identifiers'][prov_name] is not None
-                and not isinstance(prov_name, Logger)):
+        if 'startup_concurrency' in self.configuration['service']:
+            lgr.logger.warning('`startup_concurrency` is ignored, the first '
+                'run follows `worker_threads` and `provider_concurrency`')
+
+        if 'engine' in self.configuration['service']:
+            lgr.logger.warning('`engine` is ignored, jobs always run on the '
+                'worker pool')
+
+        # Provider modules are imported once an identifier needs them
+        for prov_name in self.configuration['identifiers']:
+            if (prov_name in providers.index
+                and self.configuration['identifiers'][prov_name] is not None):
 
                 # In-memory storage: Provider -> Identifier -> Object
                 self.exporter[prov_name] = {}
+                self._providers[prov_name] = providers.index[
+                    prov_name].description
 
                 # For each identifier within a module if not disabled
                 for item in self.configuration['identifiers'][prov_name]:
                     if (item is not None
-                        and ('disabled' not in item or not item['disabled'])):
-
-                        lgr.logger.info(
-                            'Initialize `%s` exporter for `%s` identifier',
-                            prov_name, item['identifier'])
-
-                        # Initialize provider instance per identifier
-                        self.exporter[prov_name][item['identifier']] = module(
-                            messages=self.configuration['service']['messages'],
-                            user_agent=random.choice(
-                                self.configuration['service']['user_agents']),
-                            log_level=self.log_level,
-                            **item
+                        and ('disabled' not in item or not item['disabled'])
+                        and self._owned(prov_name, item['identifier'])
+                        and not self.probe_only):
+
+                        self._create_instance(prov_name, item)
+
+                        # Saved data still fresh: resume at its due time
+                        next_due = self._restore_result(
+                            module=self.exporter[prov_name][item['identifier']],
+                            saved=saved_results.get(
+                                (prov_name, str(item['identifier'])))
                         )
 
                         # Schedule a job per provider instance and identifier
                         self._schedule_job(
-                            module=self.exporter[prov_name][item['identifier']]
+                            module=self.exporter[prov_name][item['identifier']],
+                            start=next_due
                         )
 
+                        if next_due is not None:
+                            continue
+
                         # First explicit run of identifier
-                        self._update_data(
-                            module=self.exporter[prov_name][item['identifier']]
-                        )
+                        startup_queue.append(
+                            self.exporter[prov_name][item['identifier']])
+                        self._awaiting_first.add(
+                            (prov_name, item['identifier']))
+
+        # Providers without an identifier to poll are not exported
+        self._update_providers({prov_name for prov_name, _ in
+            self._wanted(self.configuration)})
+
+        self._startup_collection(startup_queue)
 
     def __str__(self) -> str:
         """ Human readable print of the current class """
@@ -337,77 +712,677 @@ class SSPCollector:
 
         return json.dumps(return_obj, ensure_ascii=False, indent=4)
 
-    def _schedule_job(self, module: ModuleType) -> None:
+    def _create_instance(self, prov_name: str, item: dict) -> ModuleType:
+        """ Initialize the provider instance of the identifier """
+
+        lgr.logger.info(
+            'Initialize `%s` exporter for `%s` identifier',
+            prov_name, item['identifier'])
+
+        # Initialize provider instance per identifier
+        self.exporter[prov_name][item['identifier']] = providers.modules[
+            prov_name](
+            messages=self.configuration['service']['messages'],
+            user_agent=random.choice(
+                self.configuration['service']['user_agents']),
+            log_level=self.log_level,
+            last_balance=self.configuration['service']['messages']['init'],
+            **item
+        )
+
+        self._items[(prov_name, item['identifier'])] = item
+        self._prepare_metric(
+            module=self.exporter[prov_name][item['identifier']]
+        )
+
+        if self.configuration['service'].get('history_size', 720):
+            self.history[(prov_name, item['identifier'])] = BalanceHistory(
+                size=self.configuration['service'].get('history_size', 720))
+
+        return self.exporter[prov_name][item['identifier']]
+
+    def _is_current(self, module: ModuleType) -> bool:
+        """ Whether the instance has not been removed by a reload """
+
+        return self.exporter.get(module.__class__.__name__, {}).get(
+            module.identifier) is module
+
+    def reload(self, configuration: dict) -> None:
+        """ Apply the changed identifiers, keep the untouched ones running """
+
+        started = time.monotonic()
+
+        # The bind address and port come from the command line as well
+        if ({key: value for key, value in configuration['service'].items()
+                if key not in ('bind_address', 'bind_port')}
+            != {key: value for key, value in self.configuration['service']
+                .items() if key not in ('bind_address', 'bind_port')}):
+            lgr.logger.warning(
+                'Changes of the `service` section apply after a restart')
+
+        wanted = self._wanted(configuration)
+
+        # Probes look up and create instances under their own lock
+        with self._reload_lock, self._probe_lock:
+            removed = self._items.keys() - wanted.keys()
+            changed = [key for key in wanted.keys() & self._items.keys()
+                if wanted[key] != self._items[key]]
+
+            # Probed identifiers are created on request
+            added = ([] if self.probe_only
+                else wanted.keys() - self._items.keys())
+
+            self.configuration['identifiers'] = configuration['identifiers']
+
+            for key in removed:
+                self._remove_instance(key)
+
+            for key in changed:
+                self._update_instance(key, wanted[key])
+
+            # Providers are listed while one of their identifiers is
+            self._update_providers({prov_name for prov_name, _ in wanted})
+
+            startup_queue = []
+            for prov_name, identifier in added:
+                module = self._create_instance(
+                    prov_name, wanted[(prov_name, identifier)])
+                self._schedule_job(module=module)
+
+                startup_queue.append(module)
+                self._awaiting_first.add((prov_name, identifier))
+
+            if startup_queue:
+                self._startup_collection(startup_queue)
+
+            self.version += 1
+
+        lgr.logger.info('Configuration reloaded in %.3f seconds: '
+            '%s added, %s updated, %s removed', time.monotonic() - started,
+            len(added), len(changed), len(removed))
+
+    def _wanted(self, configuration: dict) -> dict:
+        """ Return (provider, identifier) -> item of the enabled identifiers
+            polled by this replica """
+
+        wanted = {}
+        for prov_name, items in configuration['identifiers'].items():
+            if prov_name not in providers.index or items is None:
+                continue
+
+            for item in items:
+                if (item is not None
+                    and ('disabled' not in item or not item['disabled'])
+                    and self._owned(prov_name, item['identifier'])):
+
+                    wanted[(prov_name, item['identifier'])] = item
+
+        return wanted
+
+    def _update_providers(self, wanted: set[str]) -> None:
+        """ Add and drop the providers exported by ssp_provider_info """
+
+        for prov_name in self._providers.keys() - wanted:
+            del self._providers[prov_name]
+            self.exporter.pop(prov_name, None)
+
+        for prov_name in wanted - self._providers.keys():
+            self.exporter.setdefault(prov_name, {})
+            self._providers[prov_name] = providers.index[
+                prov_name].description
+
+    def _remove_instance(self, key: tuple) -> None:
+        """ Cancel the job and drop everything kept for the identifier """
+
+        lgr.logger.info('Remove `%s` exporter for `%s` identifier', *key)
+
+        self.scheduler.cancel(key)
+        del self.exporter[key[0]][key[1]]
+        del self._items[key]
+
+        for storage in (self._labels, self.results, self._last_success,
+                        self._attempts, self.history, self.runner.lag,
+                        transport.step_stats, *self._samples.values()):
+            storage.pop(key, None)
+
+        self._awaiting_first.discard(key)
+
+        # A later identifier of the same name must sign in again
+        transport.session_cache.invalidate(*key)
+
+        if self.state is not None:
+            self.state.delete_result(*key)
+
+    def _update_instance(self, key: tuple, item: dict) -> None:
+        """ Apply the changed settings to the running instance """
+
+        lgr.logger.info('Update `%s` exporter for `%s` identifier', *key)
+
+        module = self.exporter[key[0]][key[1]]
+        previous = self._items[key]
+
+        # Settings dropped from the item fall back to the class defaults
+        for field in fields(module):
+            if field.name in item:
+                setattr(module, field.name, item[field.name])
+            elif field.name in previous:
+                setattr(module, field.name, field.default
+                    if field.default_factory is MISSING
+                    else field.default_factory())
+
+        self._items[key] = item
+
+        if item.get('password') != previous.get('password'):
+            transport.session_cache.invalidate(*key)
+
+        self._prepare_metric(module=module)
+
+        if item.get('poll_interval') != previous.get('poll_interval'):
+            self._schedule_job(module=module)
+
+    def _owned(self, provider: str, identifier: str) -> bool:
+        """ Whether the identifier belongs to the shard of this replica """
+
+        if self.shard_count == 1:
+            return True
+
+        return shard_owner(f'{provider}/{identifier}',
+            self.shard_count) == self.shard_index
+
+    def _schedule_job(self, module: ModuleType, start: float = None) -> None:
         """ Schedule the job """
 
         lgr.logger.info(
             'Add scheduler for identifier `%s`: run every %s seconds',
             module.identifier, module.poll_interval)
 
+        # Spread identifiers sharing an interval over the whole interval,
+        # the slot follows the first collection by a full interval at least
+        if (start is None
+            and self.configuration['service'].get('poll_phase_spread', True)):
+            start = phase_start(
+                f'{module.__class__.__name__}/{module.identifier}',
+                module.poll_interval,
+                earliest=time.time() + module.poll_interval)
+
         # Add the scheduler per identifier
-        schedule.every(module.poll_interval).seconds.do(
-            self._update_data,
+        self.scheduler.add(
+            key=(module.__class__.__name__, module.identifier),
+            interval=module.poll_interval,
+            func=self._dispatch_job,
+            start=start,
+            jitter=self.configuration['service'].get('poll_jitter', 0),
             module=module
         )
 
-    def _update_data(self, module: ModuleType) -> None:
-        """ Update provider data """
+    def _dispatch_job(self, module: ModuleType, due: float = None) -> None:
+        """ Hand the scheduled job over to the runner """
 
-        lgr.logger.info('Update data for `%s` identifier `%s`',
-            module.__class__.__name__, module.identifier
+        self.runner.submit(
+            key=(module.__class__.__name__, module.identifier),
+            provider=module.__class__.__name__,
+            func=self._update_data,
+            due=due,
+            module=module
         )
 
-        # Make a request to update the balance values
-        module.update_balance()
+    def _startup_collection(self, queue: list[ModuleType]) -> None:
+        """ Run the first collection in background through the runner """
+
+        lgr.logger.info('Run first collection for %s identifiers',
+            len(queue))
+
+        # Provider limits and the overlap guard cover the first run too
+        for module in queue:
+            self._dispatch_job(module=module)
+
+    def _update_data(self, module: ModuleType) -> None:
+        """ Update provider data unless it is already being collected """
+
+        key = (module.__class__.__name__, module.identifier)
+
+        if not self._polls.acquire(key):
+            lgr.logger.warning('Identifier `%s` is being collected, skip '
+                'this run', module.identifier)
+            return
+
+        try:
+            self._poll(module)
+        finally:
+            self._polls.release(key)
+
+    def _poll(self, module: ModuleType) -> None:
+        """ Collect provider data once """
 
-        lgr.logger.debug('Identifier `%s` has value %s',
-                module.identifier,
-                module.get_balance()
+        # Records of this poll share its fields, see --logformat json
+        with log_context(provider=module.__class__.__name__,
+                         identifier=str(module.identifier),
+                         poll_id=new_poll_id()):
+
+            lgr.logger.info('Update data for `%s` identifier `%s`',
+                module.__class__.__name__, module.identifier
             )
 
+            started = time.time()
+
+            # Make a request to update the balance values
+            try:
+                module.update_balance()
+            except transport.PollTimeout as err:
+                self._poll_timeout(module, err)
+            except Exception as err: # pylint: disable=broad-exception-caught
+                self._poll_failure(module, err)
+            else:
+                lgr.logger.debug('Identifier `%s` has value %s',
+                        module.identifier,
+                        module.get_balance()
+                    )
+            finally:
+                self._record_result(module, started)
+                self._refresh_metric(module)
+                self._awaiting_first.discard(
+                    (module.__class__.__name__, module.identifier))
+                self._poll_finished(module, started)
+
+    @staticmethod
+    def _poll_finished(module: ModuleType, started: float) -> None:
+        """ Log the poll outcome with its duration as a separate field """
+
+        duration = time.time() - started
+        result = getattr(module, 'last_result', None)
+
+        # The step of the last request does not describe the whole poll
+        lgr.logger.info('Identifier `%s` update finished with `%s` in %.3f '
+            'seconds', module.identifier,
+            result.code if result is not None else 'unknown', duration,
+            extra={'duration': round(duration, 3), 'step': None})
+
+    def _restore_result(self, module: ModuleType,
+                        saved: dict = None) -> float | None:
+        """ Load the saved result, return its due time if still fresh """
+
+        if saved is None:
+            return None
+
+        key = (module.__class__.__name__, module.identifier)
+        messages = self.configuration['service']['messages']
+
+        self.results[key] = PollResult(
+            code=saved['code'], balance=saved['balance'],
+            started=saved['started'], duration=saved['duration'])
+        self._attempts[key] = saved['attempts']
+
+        if saved['last_success'] is not None:
+            self._last_success[key] = PollResult(
+                balance=saved['last_success_balance'],
+                started=saved['last_success'])
+
+            if key in self.history:
+                self.history[key].append(
+                    saved['last_success'], saved['last_success_balance'])
+
+        module.last_balance = (saved['balance'] if self.results[key].success
+            else messages.get(saved['code'], messages['init']))
+        module.last_result = self.results[key]
+        self._refresh_metric(module)
+
+        now = time.time()
+        if saved['next_due'] is None or saved['next_due'] <= now:
+            return None
+
+        lgr.logger.info('Identifier `%s` restored from state, next poll '
+            'in %.0f seconds', module.identifier,
+            min(saved['next_due'] - now, module.poll_interval))
+
+        # A shortened poll_interval must not postpone the next poll
+        return min(saved['next_due'], now + module.poll_interval)
+
+    def _save_result(self, module: ModuleType) -> None:
+        """ Write the last result of the identifier to the state file """
+
+        key = (module.__class__.__name__, module.identifier)
+        last_success = self._last_success.get(key)
+
+        self.state.save_result(
+            module.__class__.__name__, module.identifier,
+            code=self.results[key].code,
+            balance=self.results[key].balance,
+            started=self.results[key].started,
+            duration=self.results[key].duration,
+            attempts=self._attempts[key],
+            last_success=last_success.started if last_success else None,
+            last_success_balance=(
+                last_success.balance if last_success else None),
+            next_due=self.scheduler.next_run.get(key)
+        )
+
+    def _poll_failure(self, module: ModuleType, err: Exception) -> None:
+        """ Report a poll interrupted by an unexpected error """
+
+        lgr.logger.error('Identifier `%s` update failed: %s',
+            module.identifier, err)
+
+        module.last_balance = self.configuration['service']['messages'][
+            'cannot_proceed']
+
+    def _record_result(self, module: ModuleType, started: float) -> None:
+        """ Turn the value left by the provider into a poll result """
+
+        key = (module.__class__.__name__, module.identifier)
+
+        # A job in flight for an identifier removed by a reload
+        if not self._is_current(module):
+            return
+
+        result = PollResult.from_balance(
+            module.get_balance(), self._codes,
+            started=started, duration=time.time() - started)
+
+        module.last_result = self.results[key] = result
+        self._attempts[key] = self._attempts.get(key, 0) + 1
+
+        if result.success:
+            self._last_success[key] = result
+
+            if key in self.history:
+                self.history[key].append(result.started, result.balance)
+
+        if self.state is not None:
+            self._save_result(module)
+
+    def _poll_timeout(self, module: ModuleType, err: Exception) -> None:
+        """ Report a poll that ran out of its time budget """
+
+        lgr.logger.error('Identifier `%s` exceeded the poll deadline: %s',
+            module.identifier, err)
+
+        messages = self.configuration['service']['messages']
+        module.last_balance = messages.get(
+            'timeout', messages['connection_error'])
+
+    def _prepare_metric(self, module: ModuleType) -> None:
+        """ Compute the labels of the identifier once """
+
+        provider = module.__class__.__name__
+
+        # Add service labels
+        labels = {
+            'identifier': str(module.identifier),
+            'provider': str(provider),
+            'poll_interval': str(human_readable_refresh_time(
+                module.poll_interval
+            ))
+        }
+
+        # Add custom labels
+        for label in sorted(module.labels):
+            labels[label] = str(module.labels[label])
+
+        self._labels[(provider, module.identifier)] = labels
+        self._refresh_metric(module)
+
+    def _refresh_metric(self, module: ModuleType) -> None:
+        """ Rebuild the samples of the identifier with its last values """
+
+        provider = module.__class__.__name__
+        key = (provider, module.identifier)
+        metric_name = self.configuration['service']['metric_name']
+
+        if module.disabled is True or not self._is_current(module):
+            return
+
+        lgr.logger.debug(
+            'Generate Gauge sample `%s` for provider `%s` '
+            'with identifier `%s`',
+            metric_name, provider, module.identifier)
+
+        # Sentinel mode encodes failures as message values in the balance,
+        # otherwise the balance keeps the last successfully collected value
+        if self.configuration['service'].get('sentinel_balances', True):
+            self._samples[metric_name][key] = Sample(
+                metric_name, self._labels[key], module.get_balance())
+        elif key in self._last_success:
+            self._samples[metric_name][key] = Sample(
+                metric_name, self._labels[key],
+                self._last_success[key].balance)
+
+        if key in self.results:
+            labels = {'identifier': str(module.identifier),
+                      'provider': provider}
+
+            self._samples['ssp_poll_status'][key] = Sample(
+                'ssp_poll_status',
+                {**labels, 'code': self.results[key].code}, 1)
+            self._samples['ssp_poll_duration_seconds'][key] = Sample(
+                'ssp_poll_duration_seconds', labels,
+                self.results[key].duration)
+            self._samples['ssp_poll_attempts_total'][key] = Sample(
+                'ssp_poll_attempts_total', labels, self._attempts[key])
+
+            if key in self._last_success:
+                self._samples['ssp_last_success_timestamp_seconds'][key] = \
+                    Sample('ssp_last_success_timestamp_seconds', labels,
+                        self._last_success[key].started)
+
+        # The trend is kept only while there is one to report
+        if key in self.history:
+            labels = {'identifier': str(module.identifier),
+                      'provider': provider}
+
+            for name, value in (
+                ('ssp_balance_burn_rate', self.history[key].burn_rate()),
+                ('ssp_balance_depletion_seconds',
+                    self.history[key].depletion())):
+
+                if value is None:
+                    self._samples[name].pop(key, None)
+                else:
+                    self._samples[name][key] = Sample(name, labels, value)
+
+        self.version += 1
+
+    def _probe_instance(self, provider: str,
+                        identifier: str) -> ModuleType | None:
+        """ Return the instance of a configured identifier, create it for
+            identifiers outside of the schedule """
+
+        with self._probe_lock:
+            for instance_identifier, instance in self.exporter.get(
+                    provider, {}).items():
+                if str(instance_identifier) == identifier:
+                    return instance
+
+            for item in (self.configuration['identifiers'].get(provider)
+                         or []):
+                if (item is not None
+                    and str(item['identifier']) == identifier
+                    and ('disabled' not in item or not item['disabled'])):
+
+                    return self._create_instance(provider, item)
+
+        return None
+
+    def probe_report(self, query: dict) -> tuple[int, str, bytes]:
+        """ Series of a single identifier, collected if older than TTL """
+
+        provider = query.get('provider', [None])[0]
+        identifier = query.get('identifier', [None])[0]
+
+        if provider is None or identifier is None:
+            return (400, 'text/plain; charset=utf-8',
+                b'Both `provider` and `identifier` are required\n')
+
+        module = (self._probe_instance(provider, identifier)
+            if provider in self.exporter else None)
+
+        if module is None:
+            return (404, 'text/plain; charset=utf-8',
+                b'Identifier is not configured\n')
+
+        key = (provider, module.identifier)
+        ttl = self.configuration['service'].get('probe_ttl', 60)
+        result = self.results.get(key)
+
+        # Probes wait for the collection in flight, scheduled or probed
+        if (result is None
+            or time.time() - result.started - result.duration >= ttl):
+            self._polls.run(key, self._poll, module=module)
+
+        return (200, CONTENT_TYPE_LATEST,
+            generate_latest(Snapshot(self._collect_samples(key))))
+
+    def history_report(self, query: dict) -> tuple[int, str, bytes]:
+        """ Recent balances as JSON, filtered by provider and identifier """
+
+        report = []
+
+        for (provider, identifier), history in self.history.items():
+            if (provider not in query.get('provider', [provider])
+                or str(identifier) not in query.get(
+                    'identifier', [str(identifier)])):
+                continue
+
+            report.append({
+                'provider': provider,
+                'identifier': str(identifier),
+                'burn_rate': history.burn_rate(),
+                'depletion_seconds': history.depletion(),
+                'samples': history.samples()
+            })
+
+        return (200, 'application/json',
+            json.dumps(report, ensure_ascii=False).encode('utf8'))
+
+    def ready(self) -> bool:
+        """ Whether every identifier has completed its first collection """
+
+        return not self._awaiting_first
+
     def collect(self) -> None:
         """ Main collector """
 
-        # For each identifier from each provider module
-        for provider, identifier_obj in self.exporter.items():
-
-            for identifier, instance in identifier_obj.items():
-
-                if instance is not None and instance.disabled is not True:
-
-                    # Add service labels
-                    labels = ['identifier', 'provider', 'poll_interval']
-                    values = [
-                        str(identifier), str(provider),
-                        str(human_readable_refresh_time(
-                            instance.poll_interval
-                        ))
-                    ]
-
-                    # Add custom labels
-                    for label in sorted(instance.labels):
-                        labels.append(label)
-                        values.append(instance.labels[label])
-
-                    lgr.logger.debug(
-                        'Generate Gauge metric `%s` for provider `%s` '
-                        'with identifier `%s`',
-                        self.configuration['service']['metric_name'],
-                        provider, identifier)
-
-                    # Generate a metric
-                    gmf_object = GaugeMetricFamily(
-                        self.configuration['service']['metric_name'],
-                        provider,
-                        labels=labels
-                    )
+        yield from self._collect_samples()
+
+        # Provider descriptions formerly carried by the help text
+        gmf_object = GaugeMetricFamily(
+            'ssp_provider_info',
+            'Self Service Portal provider description',
+            labels=['provider', 'description']
+        )
+        for provider, description in self._providers.items():
+            gmf_object.add_metric([provider, description], 1)
+        yield gmf_object
+
+        yield from self._collect_runner()
+        yield from self._collect_scheduler()
+        yield from self._collect_steps()
+        yield from self._collect_logging()
+
+    def _collect_samples(self, key: tuple = None) -> None:
+        """ Prepared samples of all identifiers or of a single one """
+
+        # A single family per metric, samples are ready-made when jobs
+        # finish, so a scrape only gathers them
+        for family_class, name, description in (
+            (GaugeMetricFamily, self.configuration['service']['metric_name'],
+                'Balance collected from Self Service Portal'),
+            (GaugeMetricFamily, 'ssp_poll_status',
+                'Result code of the last poll'),
+            (GaugeMetricFamily, 'ssp_last_success_timestamp_seconds',
+                'Start time of the last successful poll'),
+            (GaugeMetricFamily, 'ssp_poll_duration_seconds',
+                'Duration of the last poll'),
+            (CounterMetricFamily, 'ssp_poll_attempts_total',
+                'Number of polls since start'),
+            (GaugeMetricFamily, 'ssp_balance_burn_rate',
+                'Balance spent per second, fitted over recent balances'),
+            (GaugeMetricFamily, 'ssp_balance_depletion_seconds',
+                'Time left until the balance runs out at the burn rate')):
+
+            samples = self._samples[name]
+
+            gmf_object = family_class(name, description)
+            gmf_object.samples = (list(samples.values()) if key is None
+                else [samples[key]] if key in samples else [])
+            yield gmf_object
+
+    def _collect_runner(self) -> None:
+        """ Job runner metrics """
+
+        gmf_object = GaugeMetricFamily(
+            'ssp_job_queue_depth',
+            'Number of scheduled jobs waiting for a worker'
+        )
+        gmf_object.add_metric([], self.runner.queue_depth())
+        yield gmf_object
 
-                    # Add the data value
+        gmf_object = GaugeMetricFamily(
+            'ssp_scheduler_lag_seconds',
+            'Delay between the scheduled and the actual start of the last job',
+            labels=['identifier', 'provider']
+        )
+        for (provider, identifier), lag in list(self.runner.lag.items()):
+            gmf_object.add_metric([str(identifier), str(provider)], lag)
+        yield gmf_object
+
+    def _collect_steps(self) -> None:
+        """ Elapsed time, size and parse time of each step of the last poll """
+
+        for name, key, description in (
+            ('ssp_poll_step_duration_seconds', 'elapsed',
+                'Elapsed time of the step within the last poll'),
+            ('ssp_poll_step_response_bytes', 'bytes',
+                'Response body size of the step within the last poll'),
+            ('ssp_poll_step_parse_seconds', 'parse',
+                'JSON decoding time of the step within the last poll')):
+
+            gmf_object = GaugeMetricFamily(
+                name, description, labels=['identifier', 'provider', 'step'])
+
+            for (provider, identifier), steps in list(
+                    transport.step_stats.items()):
+                for step, stats in list(steps.items()):
                     gmf_object.add_metric(
-                        values,
-                        instance.get_balance()
-                        )
-                    yield gmf_object
+                        [str(identifier), str(provider), step], stats[key])
+            yield gmf_object
+
+    @staticmethod
+    def _collect_logging() -> None:
+        """ Log records handed to the writer thread or dropped """
+
+        for name, value, description in (
+            ('ssp_log_records_emitted', queue_handler.emitted,
+                'Log records queued for writing'),
+            ('ssp_log_records_dropped', queue_handler.dropped,
+                'Log records dropped because the log queue was full')):
+
+            cmf_object = CounterMetricFamily(name, description)
+            cmf_object.add_metric([], value)
+            yield cmf_object
+
+    def _collect_scheduler(self) -> None:
+        """ Scheduler metrics """
+
+        gmf_object = GaugeMetricFamily(
+            'ssp_next_run_timestamp_seconds',
+            'Unix time of the next scheduled run',
+            labels=['identifier', 'provider']
+        )
+        for key, deadline in list(self.scheduler.next_run.items()):
+            if key in self._items:
+                gmf_object.add_metric([str(key[1]), str(key[0])], deadline)
+        yield gmf_object
+
+        gmf_object = GaugeMetricFamily(
+            'ssp_schedule_lateness_seconds',
+            'Delay between the deadline and the scheduler wake-up of the '
+            'last run',
+            labels=['identifier', 'provider']
+        )
+        for key, lateness in list(self.scheduler.lateness.items()):
+            if key in self._items:
+                gmf_object.add_metric([str(key[1]), str(key[0])], lateness)
+        yield gmf_object
 
 if __name__ == '__main__':
 
@@ -418,7 +1393,16 @@ if __name__ == '__main__':
     arguments = get_args().parse_args()
 
     log_level = logging.getLevelName(arguments.loglevel.upper())
-    lgr.logger.setLevel(log_level)
+    set_log_level(log_level)
+
+    # Environment values bypass the argparse choices
+    if arguments.logformat.lower() not in LOG_FORMATS:
+        lgr.logger.critical('Unknown logging format `%s`',
+            arguments.logformat)
+        # sysexits.h: EX_USAGE
+        sys.exit(64)
+
+    set_log_format(arguments.logformat.lower())
 
     # Discovery a configuration file path
     if Path(arguments.config).is_file():
@@ -440,7 +1424,8 @@ if __name__ == '__main__':
 
     configuration = Configuration(
                         config_file=config_file,
-                        schema_file=schema_file
+                        schema_file=schema_file,
+                        cache_file=arguments.config_cache
                     )
 
     if arguments.address:
@@ -451,24 +1436,69 @@ if __name__ == '__main__':
         configuration.set_bind_port(arguments.port)
         lgr.logger.info('Set bind port to `%s`', arguments.port)
 
+    if arguments.probe_only and arguments.http_server != 'async':
+        lgr.logger.critical('Probe mode requires the `async` HTTP server')
+        # sysexits.h: EX_USAGE
+        sys.exit(64)
+
+    if not 0 <= arguments.shard_index < arguments.shard_count:
+        lgr.logger.critical('Shard index must be between 0 and %s',
+            arguments.shard_count - 1)
+        # sysexits.h: EX_USAGE
+        sys.exit(64)
+
+    if arguments.shard_count > 1:
+        lgr.logger.info('Poll shard %s of %s', arguments.shard_index,
+            arguments.shard_count)
+
 
     # Create the collector
     custom_collector = SSPCollector(
                         configuration=configuration.get_configuration(),
-                        log_level=log_level
+                        log_level=log_level,
+                        state_file=arguments.state_file,
+                        shard_index=arguments.shard_index,
+                        shard_count=arguments.shard_count,
+                        probe_only=arguments.probe_only
                     )
 
     collector_bind_address = configuration.get_bind_address()
     collector_bind_port = configuration.get_bind_port()
 
+    REGISTRY.register(custom_collector)
+
     # Server the collector
-    start_http_server(addr=collector_bind_address, port=collector_bind_port)
+    if arguments.http_server == 'async':
+        metrics_server = MetricsServer(
+            registry=REGISTRY,
+            version=lambda: custom_collector.version,
+            ready=custom_collector.ready,
+            route_workers=configuration.get_configuration()['service'].get(
+                'probe_workers', 8)
+        )
+        metrics_server.add_route('/history', custom_collector.history_report)
+        metrics_server.add_route('/probe', custom_collector.probe_report)
+        metrics_server.start(
+            address=collector_bind_address, port=collector_bind_port)
+    else:
+        start_http_server(addr=collector_bind_address, port=collector_bind_port)
 
     lgr.logger.info('Server started: http://%s:%s/metrics',
                             collector_bind_address, collector_bind_port)
 
-    REGISTRY.register(custom_collector)
+    # Apply configuration changes without a restart
+    reloader = ConfigurationReloader(
+        collector=custom_collector,
+        config_file=config_file,
+        schema_file=schema_file,
+        cache_file=arguments.config_cache
+    )
+    signal.signal(signal.SIGHUP, reloader.signal)
+
+    if arguments.watch_interval > 0:
+        custom_collector.scheduler.add(
+            key='configuration', interval=arguments.watch_interval,
+            func=reloader.check)
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    # Sleep until the nearest deadline, jobs are executed by the runner
+    custom_collector.scheduler.run()
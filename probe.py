@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+""" Self Service Portal Exporter: Probe Module """
+
+from typing import Callable, Hashable, Iterable
+
+import sys
+import threading
+
+from prometheus_client.metrics_core import Metric
+
+from logger import Logger
+
+lgr = Logger(class_name=__name__)
+
+class SingleFlight:
+    """ Collapse concurrent calls for the same key into a single one """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def acquire(self, key: Hashable) -> bool:
+        """ Register a call for the key, False if one is already in flight """
+
+        with self._lock:
+            if key in self._calls:
+                return False
+            self._calls[key] = threading.Event()
+            return True
+
+    def release(self, key: Hashable) -> None:
+        """ Mark the call as done and wake up the waiting callers """
+
+        with self._lock:
+            done = self._calls.pop(key)
+        done.set()
+
+    def run(self, key: Hashable, func: Callable, **kwargs) -> None:
+        """ Call the function, or wait for the call already in flight """
+
+        while not self.acquire(key):
+            with self._lock:
+                done = self._calls.get(key)
+
+            # The call in flight may have just finished, try again then
+            if done is not None:
+                lgr.logger.debug('Wait for collection of `%s` in flight', key)
+                done.wait()
+                return
+
+        try:
+            func(**kwargs)
+        finally:
+            self.release(key)
+
+class Snapshot:
+    """ Registry-like view over ready metric families for rendering """
+
+    def __init__(self, families: Iterable[Metric]) -> None:
+        self._families = list(families)
+
+    def collect(self) -> list[Metric]:
+        """ Return the families, as CollectorRegistry.collect() does """
+
+        return self._families
+
+if __name__ == '__main__':
+
+    lgr.logger.critical(
+        'This module must not be run as a standalone application')
+
+    # sysexits.h: EX_OSERR
+    sys.exit(71)
@@ -1,25 +1,90 @@
 """ Build a dynamic list of available exporter modules """
 
+import ast
 import os
+import threading
 
+from collections.abc import Mapping
+from dataclasses import dataclass
 from importlib import import_module
-from inspect import isclass
 from pkgutil import iter_modules
 from logger import Logger
 
-modules = {}
 current_directory = os.path.dirname(__file__)
 lgr = Logger(class_name=__name__)
 
-for (_, module_name, _) in iter_modules([current_directory]):
-    module = import_module(f'{__name__}.{module_name}')
+@dataclass(frozen=True)
+class ProviderSpec:
+    """ Provider found in the package without importing its module """
+
+    name: str
+    module_name: str
+    description: str
+
+def _scan(module_name: str) -> list[ProviderSpec]:
+    """ Find classes declaring `class_type = 'provider'` in the source """
+
+    path = os.path.join(current_directory, f'{module_name}.py')
+
+    with open(path, 'r', encoding='utf8') as source:
+        tree = ast.parse(source.read(), filename=path)
+
+    found = []
+
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+
+        for statement in node.body:
+            if (isinstance(statement, (ast.Assign, ast.AnnAssign))
+                and 'class_type' in [target.id for target in (
+                    statement.targets if isinstance(statement, ast.Assign)
+                    else [statement.target])
+                    if isinstance(target, ast.Name)]
+                and isinstance(statement.value, ast.Constant)
+                and statement.value.value == 'provider'):
+
+                found.append(ProviderSpec(
+                    name=node.name,
+                    module_name=module_name,
+                    description=(ast.get_docstring(node) or node.name).strip()
+                ))
+
+    return found
 
-    for attribute_name in dir(module):
-        attribute = getattr(module, attribute_name)
-        if (isclass(attribute)
-            and hasattr(attribute, 'class_type')
-            and attribute.class_type == 'provider'):
+class LazyProviders(Mapping):
+    """ Provider name -> class, the module is imported on first access """
+
+    def __init__(self, specs: dict[str, ProviderSpec]) -> None:
+        self.specs = specs
+        self._classes = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> type:
+        with self._lock:
+            if name not in self._classes:
+                spec = self.specs[name]
+
+                lgr.logger.info('Load provider %s (%s/%s.py)',
+                                name, __name__, spec.module_name)
+                self._classes[name] = getattr(
+                    import_module(f'{__name__}.{spec.module_name}'), name)
+
+            return self._classes[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.specs
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def __len__(self) -> int:
+        return len(self.specs)
+
+index = {}
+
+for (_, module_name, _) in iter_modules([current_directory]):
+    for provider_spec in _scan(module_name):
+        index[provider_spec.name] = provider_spec
 
-            lgr.logger.info('Load provider %s (%s/%s.py)',
-                            attribute.__name__, __name__, module_name)
-            modules[attribute_name] = attribute
+modules = LazyProviders(index)
@@ -2,14 +2,17 @@
 
 from dataclasses import dataclass, field, InitVar
 
-import locale
 import json
 import requests
 
-from lxml import html
 from logger import Logger
+from transport import PortalSession
 
-locale.setlocale(locale.LC_NUMERIC, 'ru_RU.UTF-8')
+def parse_ru_number(text: str) -> float:
+    """ Parse a number formatted for ru_RU without a process-wide locale:
+        any space groups thousands, a comma separates decimals """
+
+    return float(''.join(text.split()).replace('\u2212', '-').replace(',', '.'))
 
 @dataclass
 class AlmatelRussia:
@@ -68,7 +71,8 @@ class AlmatelRussia:
             self._lgr.logger.warning('%s: Identifier disabled', self.identifier)
             self.last_balance = self.messages['disabled']
 
-        session_object = requests.Session()
+        session_object = PortalSession(
+            provider=self.__class__.__name__, identifier=self.identifier)
         self._lgr.logger.info('%s: Sign in to almatel.ru', self.identifier)
         try:
             response = session_object.post(
@@ -82,12 +86,14 @@ class AlmatelRussia:
                     'X-Requested-With': 'XMLHttpRequest',
                     'User-Agent': self.user_agent
                 },
+                step='login',
                 verify=bool(self.tls_verify)
             )
         except requests.exceptions.RequestException as connection_error:
             self._lgr.logger.error('%s: Cannot connect to almatel.ru: %s',
                 self.identifier, connection_error)
             self.last_balance = self.messages['connection_error']
+            return
 
         if response.status_code == requests.codes.ok: # pylint: disable=no-member
             if response.json().get('ok') is True:
@@ -99,20 +105,24 @@ class AlmatelRussia:
                     headers={
                         'User-Agent': self.user_agent
                     },
+                    step='balance',
                     verify=bool(self.tls_verify)
                 )
 
                 if response.status_code == requests.codes.ok: # pylint: disable=no-member
                     if 'lk__profile-balance' in response.text:
+                        from lxml import html # pylint: disable=import-outside-toplevel
+
                         tree = html.fromstring(response.text)
+                        balance = None
 
                         try:
-                            balance = float(locale.atof(tree.xpath(
+                            balance = parse_ru_number(tree.xpath(
                                 '//div[@class="lk__profile--block '
                                 'lk__profile-balance"]/div/div/span'
                                 '[@class="question-block-value"]/text()'
-                            )[0].replace(' ','')))
-                        except ValueError as err:
+                            )[0])
+                        except (IndexError, ValueError) as err:
                             self._lgr.logger.error(
                                 '%s: Cannot get balance value: %s',
                                 self.identifier, err)
@@ -6,6 +6,7 @@ import json
 import requests
 
 from logger import Logger
+from transport import PortalSession
 
 @dataclass
 class ArubaCloud:
@@ -65,7 +66,8 @@ class ArubaCloud:
                 self.identifier)
             self.last_balance = self.messages['disabled']
 
-        session_object = requests.Session()
+        session_object = PortalSession(
+            provider=self.__class__.__name__, identifier=self.identifier)
         self._lgr.logger.info(
             '%s: Request current balance from api.dc3.computing.cloud.it',
             self.identifier)
@@ -82,6 +84,7 @@ class ArubaCloud:
                     'Content-Type': 'application/json',
                     'User-Agent': self.user_agent
                 },
+                step='balance',
                 verify=bool(self.tls_verify)
             )
 
@@ -90,6 +93,7 @@ class ArubaCloud:
                 '%s: Cannot connect to api.dc3.computing.cloud.it: %s',
                 self.identifier, connection_error)
             self.last_balance = self.messages['connection_error']
+            return
 
         if response.status_code == requests.codes.ok: # pylint: disable=no-member
             if response.json().get('Value').get('Value'):
@@ -6,6 +6,7 @@ import json
 import requests
 
 from logger import Logger
+from transport import PortalResponse, PortalSession
 
 @dataclass
 class FreedomVrnRussia:
@@ -65,7 +66,49 @@ class FreedomVrnRussia:
                 self.identifier)
             self.last_balance = self.messages['disabled']
 
-        session_object = requests.Session()
+        session_object = PortalSession(
+            provider=self.__class__.__name__, identifier=self.identifier)
+        cached_session = session_object.restore()
+
+        if cached_session is not None:
+            self._lgr.logger.info(
+                '%s: Reuse cached session for lk-api.freedom-vrn.ru',
+                self.identifier)
+
+            response = self._request_balance(
+                session_object, cached_session['token'])
+            if response is None:
+                return
+
+            # An expired session may get a login page with status 200
+            try:
+                accepted = (not session_object.rejected(response)
+                    and 'client' in response.json())
+            except (requests.exceptions.JSONDecodeError, AttributeError):
+                accepted = False
+
+            if accepted:
+                self._parse_balance(response)
+                return
+
+            self._lgr.logger.info('%s: Cached session has been rejected',
+                self.identifier)
+            session_object.forget()
+
+        access_token = self._sign_in(session_object)
+        if access_token is None:
+            return
+
+        response = self._request_balance(session_object, access_token)
+        if response is None:
+            return
+
+        if self._parse_balance(response):
+            session_object.remember(token=access_token)
+
+    def _sign_in(self, session_object: PortalSession) -> str | None:
+        """ Sign in and return access token """
+
         self._lgr.logger.info('%s: Request session from lk-api.freedom-vrn.ru',
             self.identifier)
 
@@ -82,6 +125,7 @@ class FreedomVrnRussia:
                         'password': self.password
                     }
                 },
+                step='auth',
                 verify=bool(self.tls_verify)
             )
 
@@ -90,63 +134,75 @@ class FreedomVrnRussia:
                 '%s: Cannot connect to lk-api.freedom-vrn.ru: %s',
                 self.identifier, connection_error)
             self.last_balance = self.messages['connection_error']
+            return None
 
         if (response.status_code == requests.codes.ok
             and response.json().get('error') == 0 and
             len(response.json().get('token')) > 0): # pylint: disable=no-member
 
-            access_token = response.json().get('token')
+            return response.json().get('token')
 
-            self._lgr.logger.info(
-                '%s: Request current balance from lk-api.freedom-vrn.ru',
-                self.identifier)
+        self._lgr.logger.error('%s: Cannot connect to Self Service Portal',
+            self.identifier)
+        self.last_balance = self.messages['no_answer']
+        return None
 
-            try:
-                response = session_object.post(
-                    'https://lk-api.freedom-vrn.ru/lk/api/v1',
-                    headers={
-                        'Ic-Token': access_token,
-                        'User-Agent': self.user_agent
-                    },
-                    json={
-                        'method': 'getClient',
-                        'params': {}
-                    },
-                    verify=bool(self.tls_verify)
-                )
-            except requests.exceptions.RequestException as connection_error:
-                self._lgr.logger.error(
-                    '%s: Cannot connect to lk-api.freedom-vrn.ru: %s',
-                    self.identifier, connection_error)
-                self.last_balance = self.messages['connection_error']
-
-            if (response.status_code == requests.codes.ok and
-                'client' in response.json() and
-                'billing' in response.json().get('client') and
-                'balance' in response.json().get('client').get('billing')): # pylint: disable=no-member
-                balance = response.json().get('client').get(
-                                                    'billing').get('balance')
-
-                if balance is not None and isinstance(balance, (int, float)):
-                    self._lgr.logger.info('%s: Balance has been collected',
-                        self.identifier)
-                    self._lgr.logger.debug('%s: Balance is %s',
-                        self.identifier, balance)
-
-                    self.last_balance = float(balance)
-
-                else:
-                    self._lgr.logger.error('%s: Cannot extract balance value',
-                        self.identifier)
-
-                    self.last_balance = self.messages['parsing_error']
-
-            else:
-                self._lgr.logger.error('%s: Cannot load page with balance: %s',
-                    self.identifier, response.status_code)
-                self.last_balance = self.messages['cannot_proceed']
-
-        else:
-            self._lgr.logger.error('%s: Cannot connect to Self Service Portal',
+    def _request_balance(self, session_object: PortalSession,
+                         access_token: str) -> PortalResponse | None:
+        """ Request current balance with access token """
+
+        self._lgr.logger.info(
+            '%s: Request current balance from lk-api.freedom-vrn.ru',
+            self.identifier)
+
+        try:
+            return session_object.post(
+                'https://lk-api.freedom-vrn.ru/lk/api/v1',
+                headers={
+                    'Ic-Token': access_token,
+                    'User-Agent': self.user_agent
+                },
+                json={
+                    'method': 'getClient',
+                    'params': {}
+                },
+                allow_redirects=False,
+                step='balance',
+                verify=bool(self.tls_verify)
+            )
+        except requests.exceptions.RequestException as connection_error:
+            self._lgr.logger.error(
+                '%s: Cannot connect to lk-api.freedom-vrn.ru: %s',
+                self.identifier, connection_error)
+            self.last_balance = self.messages['connection_error']
+            return None
+
+    def _parse_balance(self, response: PortalResponse) -> bool:
+        """ Extract balance value from response """
+
+        if (response.status_code == requests.codes.ok and
+            'client' in response.json() and
+            'billing' in response.json().get('client') and
+            'balance' in response.json().get('client').get('billing')): # pylint: disable=no-member
+            balance = response.json().get('client').get(
+                                                'billing').get('balance')
+
+            if balance is not None and isinstance(balance, (int, float)):
+                self._lgr.logger.info('%s: Balance has been collected',
+                    self.identifier)
+                self._lgr.logger.debug('%s: Balance is %s',
+                    self.identifier, balance)
+
+                self.last_balance = float(balance)
+                return True
+
+            self._lgr.logger.error('%s: Cannot extract balance value',
                 self.identifier)
-            self.last_balance = self.messages['no_answer']
+
+            self.last_balance = self.messages['parsing_error']
+            return False
+
+        self._lgr.logger.error('%s: Cannot load page with balance: %s',
+            self.identifier, response.status_code)
+        self.last_balance = self.messages['cannot_proceed']
+        return False
@@ -6,6 +6,7 @@ import json
 import requests
 
 from logger import Logger
+from transport import PortalResponse, PortalSession
 
 @dataclass
 class MegafonRussiaB2C:
@@ -64,7 +65,50 @@ class MegafonRussiaB2C:
             self._lgr.logger.warning('%s: Identifier disabled', self.identifier)
             self.last_balance = self.messages['disabled']
 
-        session_object = requests.Session()
+        session_object = PortalSession(
+            provider=self.__class__.__name__, identifier=self.identifier)
+        cached_session = session_object.restore()
+
+        if cached_session is not None:
+            self._lgr.logger.info('%s: Reuse cached session for api.megafon.ru',
+                self.identifier)
+
+            response = self._request_balance(
+                session_object, cached_session['token'])
+            if response is None:
+                return
+
+            # An expired session may get a login page with status 200
+            try:
+                accepted = (not session_object.rejected(response)
+                    and isinstance(response.json(), dict))
+            except requests.exceptions.JSONDecodeError:
+                accepted = False
+
+            if accepted:
+                self._parse_balance(response)
+                return
+
+            self._lgr.logger.info('%s: Cached session has been rejected',
+                self.identifier)
+            session_object.forget()
+
+        jwt_token = self._sign_in(session_object)
+        if jwt_token is None:
+            return
+
+        response = self._request_balance(session_object, jwt_token)
+        if response is None:
+            return
+
+        # Keep the session for the next poll instead of logging out
+        if (self._parse_balance(response)
+            and not session_object.remember(token=jwt_token)):
+            self._sign_out(session_object, jwt_token)
+
+    def _sign_in(self, session_object: PortalSession) -> str | None:
+        """ Sign in and return JWT token """
+
         self._lgr.logger.info('%s: Request CSRF token from api.megafon.ru',
             self.identifier)
 
@@ -76,177 +120,185 @@ class MegafonRussiaB2C:
                         'X-App-Type': 'react_lk',
                         'X-Cabinet-Capabilities': 'web-2020',
                 },
+                step='session_check',
                 verify=bool(self.tls_verify)
             )
         except requests.exceptions.RequestException as connection_error:
             self._lgr.logger.error('%s: Cannot connect to api.megafon.ru: %s',
                 self.identifier, connection_error)
             self.last_balance = self.messages['connection_error']
+            return None
 
-        if response.status_code == requests.codes.ok: # pylint: disable=no-member
-            cookies_dict = session_object.cookies.get_dict()
-
-            self._lgr.logger.debug('%s: Cookies: %s',
-                self.identifier, cookies_dict)
-
-            if 'NEW-CSRF-TOKEN' in cookies_dict:
-
-                self._lgr.logger.debug('%s: Collected СSRF token %s',
-                    self.identifier, cookies_dict['NEW-CSRF-TOKEN'])
-                self._lgr.logger.info('%s: Sign in to api.megafon.ru',
-                    self.identifier)
-
-                try:
-                    response = session_object.post(
-                        'https://api.megafon.ru/mlk/api/login',
-                        data={
-                            'login': self.identifier,
-                            'password': self.password,
-                        },
-                        headers={
-                            'User-Agent': self.user_agent,
-                            'X-App-Type': 'react_lk',
-                            'X-Cabinet-Capabilities': 'web-2020',
-                            'X-CSRF-TOKEN': cookies_dict['NEW-CSRF-TOKEN']
-                        },
-                        cookies=cookies_dict,
-                        verify=bool(self.tls_verify)
-                    )
-                except requests.exceptions.RequestException as connection_error:
-                    self._lgr.logger.error(
-                        '%s: Cannot connect to api.megafon.ru: %s',
-                        self.identifier, connection_error)
-                    self.last_balance = self.messages['connection_error']
-
-                if 'Неправильный формат телефона' in response.text:
-                    self._lgr.logger.error('%s: Invalid identifier format',
-                        self.identifier)
-                    self.last_balance = self.messages['cannot_proceed']
-
-                if 'Неправильный номер телефона или пароль' in response.text:
-                    self._lgr.logger.error('%s: Invalid identifier or password',
-                        self.identifier)
-                    self.last_balance = self.messages['cannot_proceed']
-
-                if 'Введите код с картинки' in response.text:
-                    self._lgr.logger.error('%s: Captcha request detected',
-                        self.identifier)
-                    self.last_balance = self.messages['captcha']
-
-                if 'Как получить пароль' in response.text:
-                    self._lgr.logger.error(
-                        '%s: Cannot log in to Self Service Portal: '
-                        'login form is missing', self.identifier)
-                    self.last_balance = self.messages['cannot_proceed']
-
-                if ('Превышено количество попыток входа с использованием пароля'
-                        in response.text):
-                    self._lgr.logger.error('%s: Rate limit exceeded',
-                        self.identifier)
-                    self.last_balance = self.messages['rate_limit']
-
-                # print(f'REQUEST HEADERS:\n\t{response.request.headers}')
-                # print(f'RESPONSE HEADERS:\n\t{response.headers}')
-                # print(f'RESPONSE TEXT:\n{response.text}')
-
-                if (response.status_code == requests.codes.ok
-                    and 'jwtToken' in response.json()): # pylint: disable=no-member
-                    jwt_token = response.json().get('jwtToken')
-
-                    self._lgr.logger.info('%s: Collected JWT token',
-                        self.identifier)
-
-                    self._lgr.logger.info(
-                        '%s: Request current balance from api.megafon.ru',
-                        self.identifier)
-
-                    try:
-                        response = session_object.get(
-                            'https://api.megafon.ru/mlk/api/main/balance',
-                            headers={
-                                'User-Agent': self.user_agent,
-                                'X-Cabinet-Authorization':f'Bearer {jwt_token}',
-                                'X-App-Type': 'react_lk',
-                                'X-Cabinet-Capabilities': 'web-2020',
-                            },
-                            verify=bool(self.tls_verify)
-                        )
-                    except requests.exceptions.RequestException \
-                            as connection_error:
-                        self._lgr.logger.error(
-                            '%s: Cannot connect to api.megafon.ru: %s',
-                            self.identifier, connection_error)
-                        self.last_balance = self.messages['connection_error']
-
-                    if response.status_code == requests.codes.ok: # pylint: disable=no-member
-                        if response.json().get('balanceWithLimit'):
-                            balance = response.json().get('balanceWithLimit')
-
-                            if (balance is not None
-                                and isinstance(balance, (int, float))):
-                                self._lgr.logger.info(
-                                    '%s: Balance has been collected',
-                                    self.identifier)
-                                self._lgr.logger.debug('%s: Balance is %s',
-                                    self.identifier, balance)
-
-                                self.last_balance = float(balance)
-
-                                self._lgr.logger.info(
-                                    '%s: Logging out from api.megafon.ru',
-                                    self.identifier)
-
-                                try:
-                                    response = session_object.get(
-                                        'https://api.megafon.ru/mlk/api/logout',
-                                        headers={
-                                            'User-Agent': self.user_agent,
-                                            'X-Cabinet-Authorization': f'Bearer'
-                                                f' {jwt_token}',
-                                            'X-App-Type': 'react_lk',
-                                            'X-Cabinet-Capabilities':'web-2020',
-                                        },
-                                        verify=bool(self.tls_verify)
-                                    )
-                                except requests.exceptions.RequestException \
-                                        as connection_error:
-                                    self._lgr.logger.error(
-                                    '%s: Cannot logout from api.megafon.ru: %s',
-                                        self.identifier, connection_error)
-                                    self.last_balance = \
-                                        self.messages['connection_error']
-
-                            else:
-                                self._lgr.logger.error(
-                                    '%s: Cannot extract balance value',
-                                    self.identifier)
-                                self.last_balance = \
-                                    self.messages['parsing_error']
-
-                        else:
-                            self._lgr.logger.error(
-                                '%s: Cannot extract balance value',
-                                self.identifier)
-                            self.last_balance = self.messages['parsing_error']
-
-                    else:
-                        self._lgr.logger.error(
-                            '%s: Cannot load page with balance: %s',
-                            self.identifier, response.status_code)
-                        self.last_balance = self.messages['cannot_proceed']
-
-                else:
-                    self._lgr.logger.error(
-                        '%s: Cannot log in to Self Service Portal: %s',
-                        self.identifier, response.status_code)
-                    self.last_balance = self.messages['cannot_proceed']
-
-            else:
-                self._lgr.logger.error('%s: Cannot obtain CSRF token',
-                    self.identifier)
-                self.last_balance = self.messages['cannot_proceed']
-
-        else:
+        if response.status_code != requests.codes.ok: # pylint: disable=no-member
             self._lgr.logger.error('%s: Cannot connect to Self Service Portal',
                 self.identifier)
             self.last_balance = self.messages['no_answer']
+            return None
+
+        cookies_dict = session_object.cookies.get_dict()
+
+        self._lgr.logger.debug('%s: Cookies: %s',
+            self.identifier, cookies_dict)
+
+        if 'NEW-CSRF-TOKEN' not in cookies_dict:
+            self._lgr.logger.error('%s: Cannot obtain CSRF token',
+                self.identifier)
+            self.last_balance = self.messages['cannot_proceed']
+            return None
+
+        self._lgr.logger.debug('%s: Collected СSRF token %s',
+            self.identifier, cookies_dict['NEW-CSRF-TOKEN'])
+        self._lgr.logger.info('%s: Sign in to api.megafon.ru',
+            self.identifier)
+
+        try:
+            response = session_object.post(
+                'https://api.megafon.ru/mlk/api/login',
+                data={
+                    'login': self.identifier,
+                    'password': self.password,
+                },
+                headers={
+                    'User-Agent': self.user_agent,
+                    'X-App-Type': 'react_lk',
+                    'X-Cabinet-Capabilities': 'web-2020',
+                    'X-CSRF-TOKEN': cookies_dict['NEW-CSRF-TOKEN']
+                },
+                cookies=cookies_dict,
+                step='login',
+                verify=bool(self.tls_verify)
+            )
+        except requests.exceptions.RequestException as connection_error:
+            self._lgr.logger.error(
+                '%s: Cannot connect to api.megafon.ru: %s',
+                self.identifier, connection_error)
+            self.last_balance = self.messages['connection_error']
+            return None
+
+        if 'Неправильный формат телефона' in response.text:
+            self._lgr.logger.error('%s: Invalid identifier format',
+                self.identifier)
+            self.last_balance = self.messages['cannot_proceed']
+            return None
+
+        if 'Неправильный номер телефона или пароль' in response.text:
+            self._lgr.logger.error('%s: Invalid identifier or password',
+                self.identifier)
+            self.last_balance = self.messages['cannot_proceed']
+            return None
+
+        if 'Введите код с картинки' in response.text:
+            self._lgr.logger.error('%s: Captcha request detected',
+                self.identifier)
+            self.last_balance = self.messages['captcha']
+            return None
+
+        if 'Как получить пароль' in response.text:
+            self._lgr.logger.error(
+                '%s: Cannot log in to Self Service Portal: '
+                'login form is missing', self.identifier)
+            self.last_balance = self.messages['cannot_proceed']
+            return None
+
+        if ('Превышено количество попыток входа с использованием пароля'
+                in response.text):
+            self._lgr.logger.error('%s: Rate limit exceeded',
+                self.identifier)
+            self.last_balance = self.messages['rate_limit']
+            return None
+
+        if (response.status_code != requests.codes.ok # pylint: disable=no-member
+            or 'jwtToken' not in response.json()):
+            self._lgr.logger.error(
+                '%s: Cannot log in to Self Service Portal: %s',
+                self.identifier, response.status_code)
+            self.last_balance = self.messages['cannot_proceed']
+            return None
+
+        self._lgr.logger.info('%s: Collected JWT token',
+            self.identifier)
+
+        return response.json().get('jwtToken')
+
+    def _request_balance(self, session_object: PortalSession,
+                         jwt_token: str) -> PortalResponse | None:
+        """ Request current balance with JWT token """
+
+        self._lgr.logger.info(
+            '%s: Request current balance from api.megafon.ru',
+            self.identifier)
+
+        try:
+            return session_object.get(
+                'https://api.megafon.ru/mlk/api/main/balance',
+                headers={
+                    'User-Agent': self.user_agent,
+                    'X-Cabinet-Authorization':f'Bearer {jwt_token}',
+                    'X-App-Type': 'react_lk',
+                    'X-Cabinet-Capabilities': 'web-2020',
+                },
+                allow_redirects=False,
+                step='balance',
+                verify=bool(self.tls_verify)
+            )
+        except requests.exceptions.RequestException as connection_error:
+            self._lgr.logger.error(
+                '%s: Cannot connect to api.megafon.ru: %s',
+                self.identifier, connection_error)
+            self.last_balance = self.messages['connection_error']
+            return None
+
+    def _parse_balance(self, response: PortalResponse) -> bool:
+        """ Extract balance value from response """
+
+        if response.status_code != requests.codes.ok: # pylint: disable=no-member
+            self._lgr.logger.error(
+                '%s: Cannot load page with balance: %s',
+                self.identifier, response.status_code)
+            self.last_balance = self.messages['cannot_proceed']
+            return False
+
+        balance = response.json().get('balanceWithLimit')
+
+        if balance is not None and isinstance(balance, (int, float)):
+            self._lgr.logger.info(
+                '%s: Balance has been collected',
+                self.identifier)
+            self._lgr.logger.debug('%s: Balance is %s',
+                self.identifier, balance)
+
+            self.last_balance = float(balance)
+            return True
+
+        self._lgr.logger.error(
+            '%s: Cannot extract balance value',
+            self.identifier)
+        self.last_balance = self.messages['parsing_error']
+        return False
+
+    def _sign_out(self, session_object: PortalSession,
+                  jwt_token: str) -> None:
+        """ Log out from Self Service Portal """
+
+        self._lgr.logger.info(
+            '%s: Logging out from api.megafon.ru',
+            self.identifier)
+
+        try:
+            session_object.get(
+                'https://api.megafon.ru/mlk/api/logout',
+                headers={
+                    'User-Agent': self.user_agent,
+                    'X-Cabinet-Authorization': f'Bearer {jwt_token}',
+                    'X-App-Type': 'react_lk',
+                    'X-Cabinet-Capabilities':'web-2020',
+                },
+                step='logout',
+                verify=bool(self.tls_verify)
+            )
+        except requests.exceptions.RequestException \
+                as connection_error:
+            self._lgr.logger.error(
+                '%s: Cannot logout from api.megafon.ru: %s',
+                self.identifier, connection_error)
+            self.last_balance = self.messages['connection_error']
@@ -10,8 +10,8 @@ from dataclasses import dataclass, field, InitVar
 import json
 import requests
 
-from lxml import html
 from logger import Logger
+from transport import PortalSession
 
 @dataclass
 class T2RussiaB2C:
@@ -71,7 +71,8 @@ class T2RussiaB2C:
                 self.identifier)
             self.last_balance = self.messages['disabled']
 
-        session_object = requests.Session()
+        session_object = PortalSession(
+            provider=self.__class__.__name__, identifier=self.identifier)
         self._lgr.logger.info(
             '%s: Request CSRF token and/or Session Cookie from msk.t2.ru',
             self.identifier)
@@ -82,12 +83,14 @@ class T2RussiaB2C:
                 headers={
                     'User-Agent': self.user_agent
                 },
+                step='session',
                 verify=bool(self.tls_verify),
             )
         except requests.exceptions.RequestException as connection_error:
             self._lgr.logger.error('%s: Cannot connect to msk.t2.ru: %s',
                 self.identifier, connection_error)
             self.last_balance = self.messages['connection_error']
+            return
 
         if response.status_code == requests.codes.ok: # pylint: disable=no-member
             cookies_dict = session_object.cookies.get_dict()
@@ -100,6 +103,7 @@ class T2RussiaB2C:
             }
 
             if 'csrf-token-name' in response.text:
+                from lxml import html # pylint: disable=import-outside-toplevel
 
                 tree = html.fromstring(response.text)
 
@@ -149,6 +153,7 @@ class T2RussiaB2C:
                             'password_type': 'password'
                         },
                         headers=request_headers,
+                        step='token',
                         verify=bool(self.tls_verify)
                     )
                 except requests.exceptions.RequestException as connection_error:
@@ -156,6 +161,7 @@ class T2RussiaB2C:
                         '%s: Cannot connect to msk.t2.ru: %s',
                         self.identifier, connection_error)
                     self.last_balance = self.messages['connection_error']
+                    return
 
                 if response.status_code == requests.codes.ok: # pylint: disable=no-member
                     self._lgr.logger.info('%s: Obtain access token',
@@ -178,6 +184,7 @@ class T2RussiaB2C:
                                     'Authorization': f'Bearer {access_token}',
                                     'User-Agent': self.user_agent
                                 },
+                                step='balance',
                                 verify=bool(self.tls_verify)
                             )
                         except requests.exceptions.RequestException \
@@ -187,6 +194,7 @@ class T2RussiaB2C:
                                 self.identifier, connection_error)
                             self.last_balance = \
                                 self.messages['connection_error']
+                            return
 
                         if response.status_code == requests.codes.ok: # pylint: disable=no-member
                             if response.json().get('meta').get(
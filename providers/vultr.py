@@ -6,6 +6,7 @@ import json
 import requests
 
 from logger import Logger
+from transport import PortalSession
 
 @dataclass
 class Vultr:
@@ -64,7 +65,8 @@ class Vultr:
             self._lgr.logger.warning('%s: Identifier disabled', self.identifier)
             self.last_balance = self.messages['disabled']
 
-        session_object = requests.Session()
+        session_object = PortalSession(
+            provider=self.__class__.__name__, identifier=self.identifier)
         self._lgr.logger.info('%s: Request current balance from api.vultr.com',
             self.identifier)
 
@@ -75,12 +77,14 @@ class Vultr:
                     'Authorization': f'Bearer {self.password}',
                     'User-Agent': self.user_agent
                 },
+                step='balance',
                 verify=bool(self.tls_verify)
             )
         except requests.exceptions.RequestException as connection_error:
             self._lgr.logger.error('%s: Cannot connect to api.vultr.com: %s',
                 self.identifier, connection_error)
             self.last_balance = self.messages['connection_error']
+            return
 
         if response.status_code == requests.codes.ok: # pylint: disable=no-member
             if response.json().get('account').get('balance'):
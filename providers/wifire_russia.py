@@ -6,6 +6,7 @@ import json
 import requests
 
 from logger import Logger
+from transport import PortalResponse, PortalSession
 
 @dataclass
 class WifireRussia:
@@ -64,7 +65,47 @@ class WifireRussia:
             self._lgr.logger.warning('%s: Identifier disabled', self.identifier)
             self.last_balance = self.messages['disabled']
 
-        session_object = requests.Session()
+        session_object = PortalSession(
+            provider=self.__class__.__name__, identifier=self.identifier)
+
+        if session_object.restore() is not None:
+            self._lgr.logger.info('%s: Reuse cached session for my.wifire.ru',
+                self.identifier)
+
+            response = self._request_balance(session_object)
+            if response is None:
+                return
+
+            # An expired session may get a login page with status 200
+            try:
+                accepted = (not session_object.rejected(response)
+                    and response.json().get('statusCode') == 0)
+            except (requests.exceptions.JSONDecodeError, AttributeError):
+                accepted = False
+
+            if accepted:
+                self._parse_balance(response)
+                return
+
+            self._lgr.logger.info('%s: Cached session has been rejected',
+                self.identifier)
+            session_object.forget()
+
+        if not self._sign_in(session_object):
+            return
+
+        response = self._request_balance(session_object)
+        if response is None:
+            return
+
+        # Keep the session for the next poll instead of logging out
+        if (self._parse_balance(response)
+            and not session_object.remember()):
+            self._sign_out(session_object)
+
+    def _sign_in(self, session_object: PortalSession) -> bool:
+        """ Sign in to Self Service Portal """
+
         self._lgr.logger.info('%s: Request session from my.wifire.ru',
             self.identifier)
 
@@ -75,116 +116,128 @@ class WifireRussia:
                 headers={
                     'User-Agent': self.user_agent
                 },
+                step='session',
                 verify=bool(self.tls_verify)
             )
         except requests.exceptions.RequestException as connection_error:
             self._lgr.logger.error('%s: Cannot connect to my.wifire.ru: %s',
                 self.identifier, connection_error)
             self.last_balance = self.messages['connection_error']
+            return False
 
-        if response.status_code == requests.codes.ok: # pylint: disable=no-member
-
-            self._lgr.logger.info('%s: Sign in to my.wifire.ru',
-                self.identifier)
-
-            try:
-                response = session_object.post(
-                    'https://my.wifire.ru/api/v2/login',
-                    json={
-                        'accountNumber': self.identifier,
-                        'password': self.password,
-                        'captchaCode': '',
-                        'save': 'true'
-                    },
-                    headers={
-                        'User-Agent': self.user_agent
-                    },
-                    verify=bool(self.tls_verify)
-                )
-            except requests.exceptions.RequestException as connection_error:
-                self._lgr.logger.error('%s: Cannot connect to my.wifire.ru: %s',
-                    self.identifier, connection_error)
-                self.last_balance = self.messages['connection_error']
-
-            if (response.status_code == requests.codes.ok and  # pylint: disable=no-member
-                    response.json().get('resultCode') == 0):
-
-                self._lgr.logger.info(
-                    '%s: Request current balance from my.wifire.ru',
-                    self.identifier)
-
-                try:
-                    response = session_object.get(
-                        'https://my.wifire.ru/api/v1/get-balance',
-                        headers={
-                            'User-Agent': self.user_agent
-                        },
-                        verify=bool(self.tls_verify)
-                    )
-                except requests.exceptions.RequestException as connection_error:
-                    self._lgr.logger.error(
-                        '%s: Cannot connect to my.wifire.ru: %s',
-                        self.identifier, connection_error)
-                    self.last_balance = self.messages['connection_error']
-
-                if response.status_code == requests.codes.ok: # pylint: disable=no-member
-                    if response.json().get('statusCode') == 0:
-                        balance = response.json().get('accountBalance')
-
-                        if (balance is not None
-                            and isinstance(balance, (int, float))):
-                            self._lgr.logger.info(
-                                '%s: Balance has been collected',
-                                self.identifier)
-                            self._lgr.logger.debug('%s: Balance is %s',
-                                self.identifier, balance)
-                            self.last_balance = float(balance)
-
-                            self._lgr.logger.info(
-                                '%s: Logging out from my.wifire.ru',
-                                self.identifier)
-
-                            try:
-                                response = session_object.get(
-                                    'https://my.wifire.ru/logout',
-                                    headers={
-                                        'User-Agent': self.user_agent
-                                    },
-                                    verify=bool(self.tls_verify)
-                                )
-                            except requests.exceptions.RequestException \
-                                    as connection_error:
-                                self._lgr.logger.error(
-                                    '%s: Cannot logout from my.wifire.ru: %s',
-                                    self.identifier, connection_error)
-                                self.last_balance = \
-                                    self.messages['connection_error']
-
-                        else:
-                            self._lgr.logger.error(
-                                '%s: Cannot extract balance value',
-                                self.identifier)
-                            self.last_balance = self.messages['parsing_error']
-
-                    else:
-                        self._lgr.logger.error(
-                            '%s: Cannot extract balance value',
-                            self.identifier)
-                        self.last_balance = self.messages['parsing_error']
-
-                else:
-                    self._lgr.logger.error(
-                        '%s: Cannot load page with balance: %s',
-                        self.identifier, response.status_code)
-                    self.last_balance = self.messages['cannot_proceed']
-
-            else:
-                self._lgr.logger.error(
-                    '%s: Cannot log in to Self Service Portal: %s',
-                    self.identifier, response.status_code)
-                self.last_balance = self.messages['cannot_proceed']
-
-        else:
+        if response.status_code != requests.codes.ok: # pylint: disable=no-member
             self._lgr.logger.error('%s: Cannot connect to Self Service Portal',
                 self.identifier)
             self.last_balance = self.messages['no_answer']
+            return False
+
+        self._lgr.logger.info('%s: Sign in to my.wifire.ru',
+            self.identifier)
+
+        try:
+            response = session_object.post(
+                'https://my.wifire.ru/api/v2/login',
+                json={
+                    'accountNumber': self.identifier,
+                    'password': self.password,
+                    'captchaCode': '',
+                    'save': 'true'
+                },
+                headers={
+                    'User-Agent': self.user_agent
+                },
+                step='login',
+                verify=bool(self.tls_verify)
+            )
+        except requests.exceptions.RequestException as connection_error:
+            self._lgr.logger.error('%s: Cannot connect to my.wifire.ru: %s',
+                self.identifier, connection_error)
+            self.last_balance = self.messages['connection_error']
+            return False
+
+        if (response.status_code != requests.codes.ok or  # pylint: disable=no-member
+                response.json().get('resultCode') != 0):
+            self._lgr.logger.error(
+                '%s: Cannot log in to Self Service Portal: %s',
+                self.identifier, response.status_code)
+            self.last_balance = self.messages['cannot_proceed']
+            return False
+
+        return True
+
+    def _request_balance(self, session_object: PortalSession
+                         ) -> PortalResponse | None:
+        """ Request current balance within the signed in session """
+
+        self._lgr.logger.info(
+            '%s: Request current balance from my.wifire.ru',
+            self.identifier)
+
+        try:
+            return session_object.get(
+                'https://my.wifire.ru/api/v1/get-balance',
+                headers={
+                    'User-Agent': self.user_agent
+                },
+                allow_redirects=False,
+                step='balance',
+                verify=bool(self.tls_verify)
+            )
+        except requests.exceptions.RequestException as connection_error:
+            self._lgr.logger.error(
+                '%s: Cannot connect to my.wifire.ru: %s',
+                self.identifier, connection_error)
+            self.last_balance = self.messages['connection_error']
+            return None
+
+    def _parse_balance(self, response: PortalResponse) -> bool:
+        """ Extract balance value from response """
+
+        if response.status_code != requests.codes.ok: # pylint: disable=no-member
+            self._lgr.logger.error(
+                '%s: Cannot load page with balance: %s',
+                self.identifier, response.status_code)
+            self.last_balance = self.messages['cannot_proceed']
+            return False
+
+        balance = None
+        if response.json().get('statusCode') == 0:
+            balance = response.json().get('accountBalance')
+
+        if balance is not None and isinstance(balance, (int, float)):
+            self._lgr.logger.info(
+                '%s: Balance has been collected',
+                self.identifier)
+            self._lgr.logger.debug('%s: Balance is %s',
+                self.identifier, balance)
+            self.last_balance = float(balance)
+            return True
+
+        self._lgr.logger.error(
+            '%s: Cannot extract balance value',
+            self.identifier)
+        self.last_balance = self.messages['parsing_error']
+        return False
+
+    def _sign_out(self, session_object: PortalSession) -> None:
+        """ Log out from Self Service Portal """
+
+        self._lgr.logger.info(
+            '%s: Logging out from my.wifire.ru',
+            self.identifier)
+
+        try:
+            session_object.get(
+                'https://my.wifire.ru/logout',
+                headers={
+                    'User-Agent': self.user_agent
+                },
+                step='logout',
+                verify=bool(self.tls_verify)
+            )
+        except requests.exceptions.RequestException \
+                as connection_error:
+            self._lgr.logger.error(
+                '%s: Cannot logout from my.wifire.ru: %s',
+                self.identifier, connection_error)
+            self.last_balance = self.messages['connection_error']
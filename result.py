@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+""" Self Service Portal Exporter: Poll Result Module """
+
+from dataclasses import dataclass
+
+import sys
+
+from logger import Logger
+
+lgr = Logger(class_name=__name__)
+
+@dataclass
+class PollResult:
+    """ Outcome of a single update_balance() run """
+
+    code: str = 'ok'
+    balance: float = None
+    started: float = None
+    duration: float = None
+
+    @property
+    def success(self) -> bool:
+        """ Whether a balance has been collected """
+
+        return self.code == 'ok'
+
+    @classmethod
+    def from_balance(cls, value: float | int, codes: dict[int, str],
+                     started: float = None,
+                     duration: float = None) -> 'PollResult':
+        """ Decode the value set by the provider: a balance or a message """
+
+        if value is None or value in codes:
+            return cls(code=codes.get(value, 'init'), started=started,
+                       duration=duration)
+
+        return cls(code='ok', balance=float(value), started=started,
+                   duration=duration)
+
+if __name__ == '__main__':
+
+    lgr.logger.critical(
+        'This module must not be run as a standalone application')
+
+    # sysexits.h: EX_OSERR
+    sys.exit(71)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+""" Self Service Portal Exporter: Scheduler Module """
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from types import ModuleType
+from typing import Callable, Hashable
+
+import hashlib
+import heapq
+import itertools
+import random
+import sys
+import threading
+import time
+import zlib
+
+from logger import Logger
+
+lgr = Logger(class_name=__name__)
+
+@dataclass
+class Job:
+    """ Scheduled job """
+
+    key: Hashable
+    interval: int
+    func: Callable
+    kwargs: dict = field(default_factory=dict)
+    deadline: float = None
+    jitter: float = 0
+    cancelled: bool = False
+
+class Scheduler:
+    """ Timer-heap scheduler running jobs at a fixed rate """
+
+    def __init__(self) -> None:
+        # Heap of (deadline, sequence, job), the sequence breaks ties
+        self._heap = []
+        self._sequence = itertools.count()
+        self._jobs = {}
+        self._condition = threading.Condition()
+        self._running = False
+
+        # Job key -> next deadline / how late the last run was woken up
+        self.next_run = {}
+        self.lateness = {}
+
+    def add(self, key: Hashable, interval: int, func: Callable,
+            start: float = None, jitter: float = 0, **kwargs) -> Job:
+        """ Schedule the job every `interval` seconds from `start` """
+
+        job = Job(key=key, interval=interval, func=func, kwargs=kwargs,
+                  deadline=start or time.time() + interval,
+                  jitter=min(jitter, interval))
+
+        with self._condition:
+            if key in self._jobs:
+                self._jobs[key].cancelled = True
+            self._jobs[key] = job
+            self._push(job)
+
+        return job
+
+    def cancel(self, key: Hashable) -> None:
+        """ Remove the job, its heap entry is dropped lazily """
+
+        with self._condition:
+            job = self._jobs.pop(key, None)
+            if job is not None:
+                job.cancelled = True
+            self.next_run.pop(key, None)
+            self.lateness.pop(key, None)
+
+    def _push(self, job: Job) -> None:
+        """ Put the job to the heap and wake up the loop if it is earlier """
+
+        # Jitter delays a single run, the fixed-rate anchor stays intact
+        due = job.deadline
+        if job.jitter:
+            due += random.uniform(0, job.jitter)
+
+        heapq.heappush(self._heap, (due, next(self._sequence), job))
+        self.next_run[job.key] = due
+        self._condition.notify()
+
+    def run(self) -> None:
+        """ Sleep until the nearest deadline and run the due jobs """
+
+        self._running = True
+
+        while self._running:
+            with self._condition:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                deadline, _, job = self._heap[0]
+                now = time.time()
+
+                if job.cancelled:
+                    heapq.heappop(self._heap)
+                    continue
+
+                if deadline > now:
+                    self._condition.wait(deadline - now)
+                    continue
+
+                heapq.heappop(self._heap)
+                self.lateness[job.key] = now - deadline
+
+                # Fixed rate: anchor to the deadline, skip missed slots
+                job.deadline += job.interval
+                while job.deadline <= now:
+                    job.deadline += job.interval
+                self._push(job)
+
+            try:
+                job.func(due=deadline, **job.kwargs)
+            except Exception as err: # pylint: disable=broad-exception-caught
+                lgr.logger.error('Job `%s` failed: %s', job.key, err)
+
+    def stop(self) -> None:
+        """ Leave the scheduler loop """
+
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+def phase_start(name: str, interval: int, now: float = None,
+                earliest: float = None) -> float:
+    """ Return the first start of the deterministic phase slot for a name
+        after the earliest time, now by default """
+
+    now = now or time.time()
+    earliest = now if earliest is None else earliest
+
+    # The same name always lands on the same offset within the interval
+    offset = zlib.crc32(name.encode('utf8')) % interval
+    start = earliest - earliest % interval + offset
+
+    if start <= earliest:
+        start += interval
+
+    return start
+
+def shard_owner(name: str, shard_count: int) -> int:
+    """ Return the shard a name belongs to by rendezvous hashing """
+
+    # Each shard scores the name, the highest score wins: adding a shard
+    # only takes over the names it now scores highest
+    return max(range(shard_count), key=lambda shard: hashlib.blake2b(
+        f'{shard}/{name}'.encode('utf8'), digest_size=8).digest())
+
+class JobRunner:
+    """ Executor-backed job runner with a per-provider concurrency cap """
+
+    def __init__(self, max_workers: int = 8,
+                 provider_concurrency: int = 4) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='job')
+        self._provider_concurrency = provider_concurrency
+        self._lock = threading.Lock()
+
+        # Provider -> number of dispatched jobs / jobs waiting for a slot
+        self._active = {}
+        self._pending = {}
+
+        # Job keys either waiting or running, to avoid overlapping runs
+        self._in_flight = set()
+        self._queued = 0
+
+        # Job key -> seconds between the due time and the actual start
+        self.lag = {}
+
+    def submit(self, key: Hashable, provider: str, func: Callable,
+               due: float = None, **kwargs) -> bool:
+        """ Dispatch the job to the worker pool """
+
+        job = (key, provider, func, due or time.time(), kwargs)
+
+        with self._lock:
+            if key in self._in_flight:
+                lgr.logger.warning(
+                    'Job `%s` is still in flight, skip this run', key)
+                return False
+
+            self._in_flight.add(key)
+            self._queued += 1
+
+            if self._active.get(provider, 0) < self._provider_concurrency:
+                self._active[provider] = self._active.get(provider, 0) + 1
+                self._executor.submit(self._run, job)
+            else:
+                self._pending.setdefault(provider, deque()).append(job)
+
+        return True
+
+    def _run(self, job: tuple) -> None:
+        """ Execute the job and hand the provider slot to the next one """
+
+        key, provider, func, due, kwargs = job
+
+        with self._lock:
+            self._queued -= 1
+        self.lag[key] = max(time.time() - due, 0.0)
+
+        try:
+            func(**kwargs)
+        except Exception as err: # pylint: disable=broad-exception-caught
+            lgr.logger.error('Job `%s` failed: %s', key, err)
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+                if self._pending.get(provider):
+                    self._executor.submit(
+                        self._run, self._pending[provider].popleft())
+                else:
+                    self._active[provider] -= 1
+
+    def queue_depth(self) -> int:
+        """ Return the number of jobs waiting for a worker """
+
+        return self._queued
+
+    def shutdown(self) -> None:
+        """ Stop accepting jobs and drop the waiting ones """
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == '__main__':
+
+    lgr.logger.critical(
+        'This module must not be run as a standalone application')
+
+    # sysexits.h: EX_OSERR
+    sys.exit(71)
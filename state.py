@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+""" Self Service Portal Exporter: State Module """
+
+import os
+import sqlite3
+import sys
+import threading
+
+from logger import Logger
+
+lgr = Logger(class_name=__name__)
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS results (
+        provider TEXT NOT NULL,
+        identifier TEXT NOT NULL,
+        code TEXT NOT NULL,
+        balance REAL,
+        started REAL,
+        duration REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_success REAL,
+        last_success_balance REAL,
+        next_due REAL,
+        PRIMARY KEY (provider, identifier)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS sessions (
+        name TEXT PRIMARY KEY,
+        data BLOB NOT NULL
+    )'''
+)
+
+class StateStore:
+    """ SQLite snapshot of the last poll results and sessions """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+        try:
+            # Sessions are stored here, SQLite creates the -wal and -shm
+            # files with the mode of the database file
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600))
+            self._restrict()
+
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.row_factory = sqlite3.Row
+
+            # A write per poll: keep it cheap, the snapshot is best-effort
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+
+            with self._connection:
+                for statement in SCHEMA:
+                    self._connection.execute(statement)
+
+            self._restrict()
+        except (OSError, sqlite3.Error) as err:
+            lgr.logger.error('Cannot open state file `%s`, state is not '
+                'kept between restarts: %s', path, err)
+            self._connection = None
+
+    def _restrict(self) -> None:
+        """ Make the database files readable by the owner only """
+
+        for path in (self.path, f'{self.path}-wal', f'{self.path}-shm'):
+            if os.path.exists(path):
+                os.chmod(path, 0o600)
+
+    @property
+    def enabled(self) -> bool:
+        """ Whether the state file is usable """
+
+        return self._connection is not None
+
+    def _execute(self, query: str, parameters: tuple = ()) -> list:
+        """ Run the query in its own transaction, return fetched rows """
+
+        if self._connection is None:
+            return []
+
+        with self._lock:
+            try:
+                with self._connection:
+                    return self._connection.execute(
+                        query, parameters).fetchall()
+            except sqlite3.Error as err:
+                lgr.logger.error('State file `%s`: %s', self.path, err)
+                return []
+
+    def load_results(self) -> dict:
+        """ Return (provider, identifier) -> saved result row """
+
+        return {(row['provider'], row['identifier']): dict(row)
+                for row in self._execute('SELECT * FROM results')}
+
+    def save_result(self, provider: str, identifier: str, **values) -> None:
+        """ Insert or replace the result row of the identifier """
+
+        columns = ('provider', 'identifier', *values)
+
+        self._execute(
+            f'INSERT OR REPLACE INTO results ({", ".join(columns)}) '
+            f'VALUES ({", ".join("?" * len(columns))})',
+            (provider, str(identifier), *values.values()))
+
+    def delete_result(self, provider: str, identifier: str) -> None:
+        """ Drop the result row of the identifier """
+
+        self._execute('DELETE FROM results WHERE provider = ? '
+            'AND identifier = ?', (provider, str(identifier)))
+
+    def load_sessions(self) -> dict:
+        """ Return session name -> serialized session entry """
+
+        return {row['name']: row['data']
+                for row in self._execute('SELECT name, data FROM sessions')}
+
+    def save_session(self, name: str, data: bytes) -> None:
+        """ Insert or replace the serialized session entry """
+
+        self._execute('INSERT OR REPLACE INTO sessions (name, data) '
+            'VALUES (?, ?)', (name, data))
+
+    def delete_session(self, name: str) -> None:
+        """ Drop the session entry """
+
+        self._execute('DELETE FROM sessions WHERE name = ?', (name,))
+
+    def close(self) -> None:
+        """ Close the state file """
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+if __name__ == '__main__':
+
+    lgr.logger.critical(
+        'This module must not be run as a standalone application')
+
+    # sysexits.h: EX_OSERR
+    sys.exit(71)
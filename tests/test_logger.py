@@ -0,0 +1,79 @@
+""" Self Service Portal Exporter: Logger Tests """
+
+import logging
+import os
+import sys
+import threading
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transport # pylint: disable=wrong-import-position
+from logger import set_log_level # pylint: disable=wrong-import-position
+
+class PortalHandler(BaseHTTPRequestHandler):
+    """ Portal answering every request with an empty JSON object """
+
+    def do_GET(self) -> None: # pylint: disable=invalid-name
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *_) -> None:
+        pass
+
+class RecordingHandler(logging.Handler):
+    """ Keep the records reaching the handler """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+class SetLogLevelTest(unittest.TestCase):
+    """ set_log_level() applies to the module loggers """
+
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), PortalHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.handler = RecordingHandler()
+        logging.getLogger('transport').addHandler(self.handler)
+
+    def tearDown(self) -> None:
+        logging.getLogger('transport').removeHandler(self.handler)
+        self.server.shutdown()
+        self.server.server_close()
+        set_log_level(logging.INFO)
+
+    def _request(self) -> list[str]:
+        """ Make a portal request, return the messages of the step records """
+
+        session = transport.PortalSession(provider='Test', identifier='test')
+        session.get(f'http://127.0.0.1:{self.server.server_port}/balance',
+            step='balance')
+
+        return [record.getMessage() for record in self.handler.records
+                if record.getMessage().startswith('Step `balance`')]
+
+    def test_debug_reaches_handler(self) -> None:
+        set_log_level(logging.DEBUG)
+        messages = self._request()
+
+        self.assertEqual(len(messages), 1)
+        self.assertIn('answered 200', messages[0])
+        self.assertIsNotNone(self.handler.records[-1].duration)
+
+    def test_error_quiets_module(self) -> None:
+        set_log_level(logging.ERROR)
+
+        self.assertEqual(self._request(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+""" Self Service Portal Exporter: Scheduler Tests """
+
+import os
+import sys
+import unittest
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import phase_start # pylint: disable=wrong-import-position
+
+INTERVAL = 600
+# Aligned to INTERVAL, a slot offset is the distance from NOW
+NOW = 1_800_000_000.0
+
+class PhaseStartTest(unittest.TestCase):
+    """ phase_start() returns the phase slot after the earliest time """
+
+    @staticmethod
+    def _name(offset: int) -> str:
+        """ Return a name whose slot has the offset within INTERVAL """
+
+        index = 0
+        while zlib.crc32(f'Vultr/id{index}'.encode('utf8')) % INTERVAL \
+                != offset:
+            index += 1
+        return f'Vultr/id{index}'
+
+    def test_slot_keeps_offset(self) -> None:
+        name = self._name(5)
+
+        self.assertEqual(phase_start(name, INTERVAL, now=NOW), NOW + 5)
+
+    def test_slot_right_after_first_collection_is_skipped(self) -> None:
+        # The next slot is 5 seconds away, a full interval must pass first
+        name = self._name(5)
+        start = phase_start(name, INTERVAL, now=NOW,
+            earliest=NOW + INTERVAL)
+
+        self.assertEqual(start, NOW + INTERVAL + 5)
+        self.assertGreaterEqual(start - NOW, INTERVAL)
+
+    def test_slot_at_earliest_boundary_is_skipped(self) -> None:
+        name = self._name(0)
+        start = phase_start(name, INTERVAL, now=NOW,
+            earliest=NOW + INTERVAL)
+
+        self.assertEqual(start, NOW + 2 * INTERVAL)
+
+    def test_slot_within_one_interval_after_earliest(self) -> None:
+        for index in range(50):
+            start = phase_start(f'Vultr/id{index}', INTERVAL, now=NOW,
+                earliest=NOW + INTERVAL)
+
+            self.assertGreater(start, NOW + INTERVAL)
+            self.assertLessEqual(start, NOW + 2 * INTERVAL)
+
+if __name__ == '__main__':
+    unittest.main()
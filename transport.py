@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+""" Self Service Portal Exporter: Transport Module """
+
+from urllib.parse import urlparse
+
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+
+from prometheus_client import Counter, Histogram
+from requests.adapters import HTTPAdapter
+from logger import Logger, update_log_context
+from state import StateStore
+
+try:
+    from orjson import loads as json_loads # pylint: disable=no-name-in-module
+except ImportError:
+    json_loads = json.loads
+
+lgr = Logger(class_name=__name__)
+
+class HostLimiter:
+    """ Token bucket with a max-in-flight gate for a portal host """
+
+    def __init__(self, rate: float = None, burst: int = 1,
+                 max_in_flight: int = None) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._gate = (threading.BoundedSemaphore(max_in_flight)
+                      if max_in_flight else None)
+
+    def _take_token(self, deadline: float = None) -> bool:
+        """ Block until a token is available, False if it comes too late """
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst,
+                    self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+
+                wait = (1 - self._tokens) / self.rate
+
+            # Do not sleep for a token arriving after the deadline
+            if deadline is not None and now + wait > deadline:
+                return False
+
+            time.sleep(wait)
+
+    def acquire(self, deadline: float = None) -> bool:
+        """ Wait for a free slot and a token until the monotonic deadline """
+
+        if self._gate is not None:
+            timeout = (None if deadline is None
+                       else max(deadline - time.monotonic(), 0))
+            if not self._gate.acquire(timeout=timeout):
+                return False
+
+        if self.rate and not self._take_token(deadline):
+            self.release()
+            return False
+
+        return True
+
+    def release(self) -> None:
+        """ Free the in-flight slot """
+
+        if self._gate is not None:
+            self._gate.release()
+
+class ConnectionPool:
+    """ Keep-alive connection pools shared by all sessions of a provider """
+
+    def __init__(self, pool_connections: int = 10,
+                 pool_maxsize: int = 10) -> None:
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._adapters = {}
+        self._lock = threading.Lock()
+
+    def adapter(self, provider: str) -> HTTPAdapter:
+        """ Return the adapter holding the provider connections per host """
+
+        with self._lock:
+            if provider not in self._adapters:
+                lgr.logger.debug('Create connection pool for `%s`', provider)
+                self._adapters[provider] = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize)
+
+            return self._adapters[provider]
+
+    def close(self) -> None:
+        """ Close all pooled connections """
+
+        with self._lock:
+            for adapter in self._adapters.values():
+                adapter.close()
+            self._adapters.clear()
+
+class SessionCache:
+    """ Authentication cookies and tokens per identifier with expiry """
+
+    def __init__(self) -> None:
+        self.ttl = 0
+        self.path = None
+        self.store = None
+        self._fernet = None
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def configure(self, ttl: int = 3600, path: str = None,
+                  key: str = None, store: StateStore = None) -> None:
+        """ Apply the settings and load the persisted entries, the file at
+            `path` takes precedence over the state store """
+
+        self.ttl = ttl
+        self.path = path
+        self.store = store if path is None else None
+        self._fernet = None
+
+        if key:
+            try:
+                from cryptography.fernet import Fernet # pylint: disable=import-outside-toplevel
+                self._fernet = Fernet(key)
+            except ImportError:
+                lgr.logger.error('Install `cryptography` to encrypt the '
+                    'session cache, persistence is disabled')
+                self.path = None
+                self.store = None
+        elif self.store is not None and self.ttl > 0:
+            lgr.logger.warning('Sessions are kept unencrypted in the state '
+                'file `%s`, set `session_cache.key` to encrypt them',
+                self.store.path)
+
+        self._load()
+
+    @property
+    def enabled(self) -> bool:
+        """ Whether sessions are kept between polls """
+
+        return self.ttl > 0
+
+    def get(self, provider: str, identifier: str) -> dict | None:
+        """ Return the entry if it has not expired yet """
+
+        with self._lock:
+            entry = self._entries.get(f'{provider}/{identifier}')
+
+            if entry is not None and entry['expires'] <= time.time():
+                del self._entries[f'{provider}/{identifier}']
+                return None
+
+            return entry
+
+    def set(self, provider: str, identifier: str, cookies: dict = None,
+            token: str = None) -> None:
+        """ Store the session material for `ttl` seconds """
+
+        with self._lock:
+            self._entries[f'{provider}/{identifier}'] = {
+                'cookies': cookies or {},
+                'token': token,
+                'expires': time.time() + self.ttl
+            }
+            self._save(f'{provider}/{identifier}')
+
+    def invalidate(self, provider: str, identifier: str) -> None:
+        """ Drop the entry """
+
+        with self._lock:
+            if self._entries.pop(f'{provider}/{identifier}', None):
+                self._save(f'{provider}/{identifier}')
+
+    def _encode(self, value: dict) -> bytes:
+        """ Serialize and encrypt if a key is set """
+
+        data = json.dumps(value).encode('utf8')
+        if self._fernet is not None:
+            data = self._fernet.encrypt(data)
+        return data
+
+    def _decode(self, data: bytes) -> dict:
+        """ Decrypt if a key is set and deserialize """
+
+        if self._fernet is not None:
+            data = self._fernet.decrypt(data)
+        return json.loads(data)
+
+    def _load(self) -> None:
+        """ Read the persisted entries """
+
+        self._entries = {}
+
+        # Sessions saved while the cache was enabled must not come back
+        if not self.enabled:
+            return
+
+        if self.store is not None:
+            for name, data in self.store.load_sessions().items():
+                try:
+                    self._entries[name] = self._decode(data)
+                except Exception as err: # pylint: disable=broad-exception-caught
+                    lgr.logger.error('Cannot load cached session `%s`: %s',
+                        name, err)
+
+        elif self.path is not None and os.path.isfile(self.path):
+            try:
+                with open(self.path, 'rb') as cache_file:
+                    self._entries = self._decode(cache_file.read())
+            except Exception as err: # pylint: disable=broad-exception-caught
+                lgr.logger.error('Cannot load session cache `%s`: %s',
+                    self.path, err)
+
+        # Expired entries are dropped from memory and from the store
+        for name in [name for name, entry in self._entries.items()
+                     if entry.get('expires', 0) <= time.time()]:
+            del self._entries[name]
+            if self.store is not None:
+                self.store.delete_session(name)
+
+    def _save(self, name: str) -> None:
+        """ Persist the changed entry, the caller holds the lock """
+
+        if not self.enabled:
+            return
+
+        # The state store keeps a row per entry
+        if self.store is not None:
+            if name in self._entries:
+                self.store.save_session(name, self._encode(self._entries[name]))
+            else:
+                self.store.delete_session(name)
+            return
+
+        if self.path is None:
+            return
+
+        data = self._encode(self._entries)
+
+        try:
+            # Write aside and rename to never leave a truncated file
+            file_descriptor = os.open(f'{self.path}.tmp',
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(file_descriptor, 'wb') as cache_file:
+                cache_file.write(data)
+            os.replace(f'{self.path}.tmp', self.path)
+        except OSError as err:
+            lgr.logger.error('Cannot save session cache `%s`: %s',
+                self.path, err)
+
+class PortalResponse:
+    """ Response wrapper decoding the JSON body only once """
+
+    _undecoded = object()
+
+    def __init__(self, response: requests.Response, stats: dict) -> None:
+        self._response = response
+        self._json = self._undecoded
+        self._stats = stats
+        self._stats['bytes'] = len(response.content)
+
+    def __getattr__(self, name: str):
+        return getattr(self._response, name)
+
+    def json(self, **_) -> dict | list:
+        """ Return the parsed body, decoded on the first call """
+
+        if self._json is self._undecoded:
+            started = time.perf_counter()
+            try:
+                self._json = json_loads(self._response.content)
+            except ValueError as err:
+                raise requests.exceptions.JSONDecodeError(
+                    str(err), self._response.text, 0) from err
+            finally:
+                self._stats['parse'] = time.perf_counter() - started
+
+        return self._json
+
+class PollTimeout(Exception):
+    """ The time budget of a single poll has run out """
+
+# Provider -> limiter settings, (provider, host) -> limiter
+_rate_limits = {}
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+# Connect/read timeout per request and total budget per poll, in seconds
+_timeouts = {'connect': 5, 'read': 30, 'poll': 120}
+
+# (Provider, identifier) -> step -> elapsed seconds, response bytes and
+# parse seconds of the last poll
+step_stats = {}
+
+# Request metrics by provider and step, identifiers are left out to keep
+# the number of series bounded
+request_duration = Histogram(
+    'ssp_portal_request_duration_seconds',
+    'Duration of requests to Self Service Portals',
+    ['provider', 'step'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+request_responses = Counter(
+    'ssp_portal_responses',
+    'Responses of Self Service Portals by status code, `timeout` and '
+    '`error` for requests without a response',
+    ['provider', 'step', 'code']
+)
+request_bytes = Counter(
+    'ssp_portal_response_bytes',
+    'Response body bytes received from Self Service Portals',
+    ['provider', 'step']
+)
+
+pool = ConnectionPool()
+session_cache = SessionCache()
+
+def configure(rate_limits: dict = None, timeouts: dict = None,
+              connection_pool: dict = None,
+              session_cache_settings: dict = None,
+              session_store: StateStore = None) -> None:
+    """ Set the limiter settings, the timeouts, the pool sizes and the
+        session cache """
+
+    _rate_limits.clear()
+    _rate_limits.update(rate_limits or {})
+    _timeouts.update(timeouts or {})
+
+    # Adapters pick up the pool sizes on the next session
+    pool.close()
+    for key, value in (connection_pool or {}).items():
+        setattr(pool, key, value)
+
+    session_cache.configure(**(session_cache_settings or {}),
+        store=session_store)
+
+    with _limiters_lock:
+        _limiters.clear()
+
+def observe(provider: str, step: str, elapsed: float, code: str,
+            size: int = 0) -> None:
+    """ Record a finished request, every PortalSession request ends here """
+
+    request_duration.labels(provider, step).observe(elapsed)
+    request_responses.labels(provider, step, code).inc()
+    if size:
+        request_bytes.labels(provider, step).inc(size)
+
+def get_limiter(provider: str, host: str) -> HostLimiter | None:
+    """ Return the limiter shared by the provider identifiers hitting the
+        host """
+
+    if provider not in _rate_limits:
+        return None
+
+    # Providers sharing a host keep their own settings and budgets
+    with _limiters_lock:
+        if (provider, host) not in _limiters:
+            lgr.logger.debug('Create rate limiter for `%s` (%s)',
+                host, provider)
+            _limiters[(provider, host)] = HostLimiter(
+                **_rate_limits[provider])
+
+        return _limiters[(provider, host)]
+
+class PortalSession(requests.Session):
+    """ HTTP session with host limits, timeouts and a per-poll deadline """
+
+    def __init__(self, provider: str = None, identifier: str = None) -> None:
+        super().__init__()
+        self.provider = provider
+        self.identifier = identifier
+        self.deadline = time.monotonic() + _timeouts['poll']
+        self.stats = step_stats[(provider, identifier)] = {}
+
+        # Reuse the provider connections instead of a handshake per poll
+        adapter = pool.adapter(provider)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def close(self) -> None:
+        """ Keep the shared adapters open, see ConnectionPool.close() """
+
+    def restore(self) -> dict | None:
+        """ Load the cached cookies and return the cached entry """
+
+        entry = session_cache.get(self.provider, self.identifier)
+
+        if entry is not None:
+            self.cookies.update(entry['cookies'])
+
+        return entry
+
+    def remember(self, token: str = None) -> bool:
+        """ Cache the current cookies and token for the next polls """
+
+        if not session_cache.enabled:
+            return False
+
+        session_cache.set(self.provider, self.identifier,
+            cookies=self.cookies.get_dict(), token=token)
+        return True
+
+    def forget(self) -> None:
+        """ Drop the cached entry and the cookies """
+
+        session_cache.invalidate(self.provider, self.identifier)
+        self.cookies.clear()
+
+    @staticmethod
+    def rejected(response: PortalResponse) -> bool:
+        """ Whether the portal refused the session or sent it to sign in """
+
+        return (response.status_code in (401, 403)
+                or response.is_redirect or bool(response.history))
+
+    def request(self, method: str, url: str, *args, step: str = None,
+                **kwargs) -> PortalResponse:
+        step = step or urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]
+
+        # Cancel the remaining steps once the poll budget is spent
+        if time.monotonic() >= self.deadline:
+            raise PollTimeout(f'Poll budget exhausted before `{step}` step')
+
+        stats = self.stats[step] = {'elapsed': 0.0, 'bytes': 0, 'parse': 0.0}
+        started = time.monotonic()
+
+        # Later records of the poll belong to this step until the next one
+        update_log_context(step=step)
+
+        limiter = get_limiter(self.provider, urlparse(url).hostname)
+
+        # Waiting for the host limiter is spent from the poll budget too
+        if limiter is not None and not limiter.acquire(self.deadline):
+            stats['elapsed'] = time.monotonic() - started
+            observe(self.provider, step, stats['elapsed'], 'timeout')
+            raise PollTimeout(
+                f'Poll budget exhausted waiting for the host limiter '
+                f'before `{step}` step')
+
+        try:
+            remaining = self.deadline - time.monotonic()
+
+            if remaining <= 0:
+                raise PollTimeout(
+                    f'Poll budget exhausted before `{step}` step')
+
+            kwargs.setdefault('timeout', (
+                min(_timeouts['connect'], remaining),
+                min(_timeouts['read'], remaining)
+            ))
+
+            response = super().request(method, url, *args, **kwargs)
+
+        except requests.exceptions.Timeout as err:
+            stats['elapsed'] = time.monotonic() - started
+            observe(self.provider, step, stats['elapsed'], 'timeout')
+
+            if time.monotonic() >= self.deadline:
+                raise PollTimeout(
+                    f'Poll budget exhausted during `{step}` step') from err
+            raise
+
+        except requests.exceptions.RequestException:
+            stats['elapsed'] = time.monotonic() - started
+            observe(self.provider, step, stats['elapsed'], 'error')
+            raise
+
+        finally:
+            if limiter is not None:
+                limiter.release()
+
+        stats['elapsed'] = time.monotonic() - started
+        portal_response = PortalResponse(response, stats)
+        observe(self.provider, step, stats['elapsed'],
+            str(response.status_code), stats['bytes'])
+
+        lgr.logger.debug('Step `%s` answered %s in %.3f seconds', step,
+            response.status_code, stats['elapsed'],
+            extra={'duration': round(stats['elapsed'], 3)})
+
+        return portal_response
+
+if __name__ == '__main__':
+
+    lgr.logger.critical(
+        'This module must not be run as a standalone application')
+
+    # sysexits.h: EX_OSERR
+    sys.exit(71)